@@ -61,10 +61,13 @@ from registration.conf import settings
 from registration.backends import get_backend
 from registration.models import RegistrationProfile
 from registration.utils import get_site
+from registration.utils import email_connection_pool
+from registration.utils import get_from_registry
 from registration.admin.forms import RegistrationAdminForm
 from registration.compat import import_module
 from registration.compat import force_unicode
 from registration.compat import transaction_atomic
+from registration.compat import get_user_model
 
 
 csrf_protect_m = method_decorator(csrf_protect)
@@ -81,8 +84,17 @@ def get_supplement_admin_inline_base_class(path=None):
     appropriate name), ``django.core.exceptions.ImproperlyConfigured``
     is raised.
 
+    The class is resolved once per process (see
+    ``registration.utils.get_from_registry``).
+
     """
     path = path or settings.REGISTRATION_SUPPLEMENT_ADMIN_INLINE_BASE_CLASS
+    return get_from_registry(
+        ('supplement_admin_inline_base_class', path),
+        lambda: _get_supplement_admin_inline_base_class(path))
+
+
+def _get_supplement_admin_inline_base_class(path):
     i = path.rfind('.')
     module, attr = path[:i], path[i+1:]
     try:
@@ -157,6 +169,33 @@ class RegistrationSupplementAdminInlineBase(admin.StackedInline):
         return True
 
 
+if hasattr(admin, 'SimpleListFilter'):
+    class RegistrationStatusListFilter(admin.SimpleListFilter):
+        """List filter of the effective status of registration profiles
+
+        ``'expired'`` is available in addition to the inspection status and
+        all statuses are filtered in the database.
+
+        """
+        title = _('status')
+        parameter_name = 'status'
+
+        def lookups(self, request, model_admin):
+            lookups = list(RegistrationProfile.STATUS_LIST)
+            lookups.append(('expired', _('Activation key has expired')))
+            return lookups
+
+        def queryset(self, request, queryset):
+            # RegistrationProfileQuerySet has a method for each status
+            if self.value() in ('untreated', 'accepted', 'expired', 'rejected'):
+                return getattr(queryset, self.value())()
+            return queryset
+    status_list_filter = RegistrationStatusListFilter
+else:
+    # Django 1.3 doesn't have ``SimpleListFilter``
+    status_list_filter = '_status'
+
+
 class RegistrationAdmin(admin.ModelAdmin):
     """Admin class of RegistrationProfile
 
@@ -187,7 +226,7 @@ class RegistrationAdmin(admin.ModelAdmin):
     
     raw_id_fields = ['user']
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
-    list_filter = ('_status', )
+    list_filter = (status_list_filter, )
     ordering = ['_status']
     form = RegistrationAdminForm
     backend = get_backend()
@@ -253,27 +292,27 @@ class RegistrationAdmin(admin.ModelAdmin):
 
     def accept_users(self, request, queryset):
         """Accept the selected users, if they are not already accepted"""
-        for profile in queryset:
-            self.backend.accept(profile, request=request, force=True)
+        with email_connection_pool():
+            self.backend.accept_many(queryset, request=request, force=True)
     accept_users.short_description = _(
         "(Re)Accept registrations of selected users"
     )
 
     def reject_users(self, request, queryset):
         """Reject the selected users, if they are not already accepted"""
-        for profile in queryset:
-            self.backend.reject(profile, request=request)
-            profile.user.delete()
+        with email_connection_pool():
+            self.backend.reject_many(queryset, request=request)
+        user_pks = list(queryset.values_list('user', flat=True))
         queryset.delete()
+        get_user_model().objects.filter(pk__in=user_pks).delete()
     reject_users.short_description = _(
         "Reject registrations of selected users"
     )
 
     def force_activate_users(self, request, queryset):
         """Activates the selected users, if they are not already activated"""
-        for profile in queryset:
-            self.backend.accept(profile, request=request, send_email=False)
-            self.backend.activate(profile.activation_key, request=request)
+        with email_connection_pool():
+            self.backend.force_activate_many(queryset, request=request)
     force_activate_users.short_description = _(
         "Activate selected users forcibly"
     )
@@ -288,10 +327,8 @@ class RegistrationAdmin(admin.ModelAdmin):
 
         """
         site = get_site(request)
-        for profile in queryset:
-            if not profile.activation_key_expired():
-                if profile.status != 'rejected':
-                    profile.send_acceptance_email(site=site)
+        RegistrationProfile.objects.send_acceptance_emails(
+            queryset.select_related('user'), site=site)
     resend_acceptance_email.short_description = _(
         "Re-send acceptance emails to selected users"
     )
@@ -45,6 +45,7 @@ from django.core.exceptions import ImproperlyConfigured
 
 from registration.conf import settings
 from registration.compat import import_module
+from registration.utils import get_from_registry
 from registration.backends.base import RegistrationBackendBase
 
 
@@ -58,8 +59,16 @@ def get_backend_class(path=None):
     appropriate name), ``django.core.exceptions.ImproperlyConfigured``
     is raised.
 
+    The class is resolved once per process (see
+    ``registration.utils.get_from_registry``).
+
     """
     path = path or settings.REGISTRATION_BACKEND_CLASS
+    return get_from_registry(('backend_class', path),
+                             lambda: _get_backend_class(path))
+
+
+def _get_backend_class(path):
     i = path.rfind('.')
     module, attr = path[:i], path[i+1:]
     try:
@@ -90,5 +99,10 @@ def get_backend(path=None):
     appropriate name), ``django.core.exceptions.ImproperlyConfigured``
     is raised.
 
+    The instance is created once per process and reused thus backends
+    should not keep per-request state on the instance.
+
     """
-    return get_backend_class(path)()
+    path = path or settings.REGISTRATION_BACKEND_CLASS
+    return get_from_registry(('backend', path),
+                             lambda: get_backend_class(path)())
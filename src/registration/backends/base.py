@@ -18,7 +18,11 @@ class RegistrationBackendBase(object):
         register                      -- register a new user
         accept                        -- accept a registration
         reject                        -- reject a registration
+        accept_many                   -- accept registrations in bulk
+        reject_many                   -- reject registrations in bulk
         activate                      -- activate a user
+        activate_many                 -- activate users in bulk
+        force_activate_many           -- accept and activate users in bulk
         get_supplement_class          -- get registration supplement class
         get_activation_form_class     -- get activation form class
         get_registration_form_class   -- get registration form class
@@ -75,13 +79,53 @@ class RegistrationBackendBase(object):
         """
         raise NotImplementedError
 
+    def accept_many(self, queryset, request,
+                    send_email=True, message=None, force=False):
+        """accept account registrations of profiles in ``queryset`` (a
+        queryset of ``RegistrationProfile``)
+
+        Returning should be a list of accepted ``User``.
+
+        The default implementation call ``accept`` for each profile thus
+        subclasses should override this method with a bulk implementation.
+
+        """
+        users = []
+        for profile in queryset:
+            user = self.accept(profile, request, send_email=send_email,
+                               message=message, force=force)
+            if user:
+                users.append(user)
+        return users
+
+    def reject_many(self, queryset, request, send_email=True, message=None):
+        """reject account registrations of profiles in ``queryset`` (a
+        queryset of ``RegistrationProfile``)
+
+        Returning should be a list of rejected ``User``.
+
+        The default implementation call ``reject`` for each profile thus
+        subclasses should override this method with a bulk implementation.
+
+        """
+        users = []
+        for profile in queryset:
+            user = self.reject(profile, request, send_email=send_email,
+                               message=message)
+            if user:
+                users.append(user)
+        return users
+
     def activate(self, activation_key, request, password=None, send_email=True,
-                 message=None, no_profile_delete=False):
+                 message=None, no_profile_delete=False, profile=None):
         """activate account with ``activation_key`` and ``password``
 
         This method should be called after the account registration has
         accepted, otherwise it should not be success.
 
+        ``profile`` is the ``RegistrationProfile`` of ``activation_key`` if
+        the caller has already loaded it, otherwise ``None``.
+
         Returning is ``user``, ``password`` and ``is_generated`` for success,
         ``None`` for fail.
 
@@ -91,6 +135,50 @@ class RegistrationBackendBase(object):
         """
         raise NotImplementedError
 
+    def activate_many(self, queryset, request, send_email=None, message=None,
+                      processes=None):
+        """activate accepted account registrations of profiles in
+        ``queryset`` (a queryset of ``RegistrationProfile``) with generated
+        passwords
+
+        Returning should be a list of activated ``User``.
+
+        ``processes`` is the number of processes used to hash the passwords
+        and should be specified only by management commands.
+
+        The default implementation call ``activate`` for each profile thus
+        subclasses should override this method with a bulk implementation.
+
+        """
+        users = []
+        for profile in queryset.filter(_status='accepted'):
+            user = self.activate(profile.activation_key, request,
+                                 send_email=send_email, message=message)
+            if user:
+                users.append(user)
+        return users
+
+    def force_activate_many(self, queryset, request, send_email=None,
+                            message=None, processes=None):
+        """accept and activate account registrations of profiles in
+        ``queryset`` (a queryset of ``RegistrationProfile``) with generated
+        passwords
+
+        Returning should be a list of activated ``User``.
+
+        The profiles are accepted with ``accept_many`` (without email) and
+        then activated with ``activate_many``.
+
+        """
+        # the queryset might be filtered by the status thus fix the profiles
+        # before accepting them
+        pks = list(queryset.values_list('pk', flat=True))
+        queryset = queryset.model._default_manager.filter(pk__in=pks)
+        self.accept_many(queryset, request, send_email=False)
+        return self.activate_many(queryset, request,
+                                  send_email=send_email, message=message,
+                                  processes=processes)
+
     def get_supplement_class(self):
         """Return the current registration supplement class"""
         raise NotImplementedError
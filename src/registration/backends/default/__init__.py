@@ -40,7 +40,6 @@ Original License::
 
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
-import sys
 from django.core.urlresolvers import reverse
 
 from registration import signals
@@ -234,8 +233,69 @@ class DefaultRegistrationBackend(RegistrationBackendBase):
 
         return rejected_user
 
+    def accept_many(self, queryset, request, send_email=None, message=None,
+                    force=False):
+        """accept the account registrations of profiles in ``queryset``
+
+        A bulk version of ``accept``. The registrations are accepted with
+        ``RegistrationProfile.objects.accept_many()`` which uses set-based
+        queries and sends the acceptance emails in a batch. The signal
+        ``registration.signals.user_accepted`` is sent for each accepted
+        ``User`` as ``accept`` does.
+
+        Returning a list of accepted ``User``.
+
+        """
+        if send_email is None:
+            send_email = settings.REGISTRATION_ACCEPTANCE_EMAIL
+
+        profiles = RegistrationProfile.objects.accept_many(
+            queryset, self.get_site(request),
+            send_email=send_email, message=message,
+            force=force,
+        )
+
+        for profile in profiles:
+            signals.user_accepted.send(
+                sender=self.__class__,
+                user=profile.user,
+                profile=profile,
+                request=request,
+            )
+
+        return [profile.user for profile in profiles]
+
+    def reject_many(self, queryset, request, send_email=None, message=None):
+        """reject the account registrations of profiles in ``queryset``
+
+        A bulk version of ``reject``. The registrations are rejected with
+        ``RegistrationProfile.objects.reject_many()`` which uses set-based
+        queries and sends the rejection emails in a batch. The signal
+        ``registration.signals.user_rejected`` is sent for each rejected
+        ``User`` as ``reject`` does.
+
+        Returning a list of rejected ``User``.
+
+        """
+        if send_email is None:
+            send_email = settings.REGISTRATION_REJECTION_EMAIL
+
+        profiles = RegistrationProfile.objects.reject_many(
+            queryset, self.get_site(request),
+            send_email=send_email, message=message)
+
+        for profile in profiles:
+            signals.user_rejected.send(
+                sender=self.__class__,
+                user=profile.user,
+                profile=profile,
+                request=request,
+            )
+
+        return [profile.user for profile in profiles]
+
     def activate(self, activation_key, request, password=None, send_email=None,
-                 message=None, no_profile_delete=False):
+                 message=None, no_profile_delete=False, profile=None):
         """activate user with ``activation_key`` and ``password``
 
         Given an activation key, password, look up and activate the user
@@ -258,6 +318,9 @@ class DefaultRegistrationBackend(RegistrationBackendBase):
         password has generated or not as the keyword argument ``is_generated``
         and the class of this backend as the sender
 
+        If the ``RegistrationProfile`` of ``activation_key`` has already been
+        loaded, pass it as ``profile`` to save the lookup queries.
+
         """
         if send_email is None:
             send_email = settings.REGISTRATION_ACTIVATION_EMAIL
@@ -268,7 +331,8 @@ class DefaultRegistrationBackend(RegistrationBackendBase):
             password=password,
             send_email=send_email,
             message=message,
-            no_profile_delete=no_profile_delete)
+            no_profile_delete=no_profile_delete,
+            profile=profile)
 
         if activated:
             user, password, is_generated = activated
@@ -282,13 +346,43 @@ class DefaultRegistrationBackend(RegistrationBackendBase):
             return user
         return None
 
+    def activate_many(self, queryset, request, send_email=None, message=None,
+                      processes=None):
+        """activate accepted account registrations of profiles in
+        ``queryset`` with generated passwords
+
+        A bulk version of ``activate``. The users are activated with
+        ``RegistrationProfile.objects.activate_many()`` which hashes the
+        passwords (on a pool of ``processes`` processes when it is more than
+        ``1``), writes the users in bulk and sends the activation emails in a
+        batch. The signal
+        ``registration.signals.user_activated`` is sent for each activated
+        ``User`` as ``activate`` does.
+
+        Returning a list of activated ``User``.
+
+        """
+        if send_email is None:
+            send_email = settings.REGISTRATION_ACTIVATION_EMAIL
+
+        activated = RegistrationProfile.objects.activate_many(
+            queryset, self.get_site(request),
+            send_email=send_email, message=message, processes=processes)
+
+        for user, password, is_generated in activated:
+            signals.user_activated.send(
+                sender=self.__class__,
+                user=user,
+                password=password,
+                is_generated=is_generated,
+                request=request,
+            )
+
+        return [user for user, password, is_generated in activated]
+
     def get_supplement_class(self):
         """Return the current registration supplement class"""
-        # cache mechanisms will break the test thus disable it in test
-        if not hasattr(self, '_supplement_class_cache') or 'test' in sys.argv:
-            cls = get_supplement_class()
-            setattr(self, '_supplement_class_cache', cls)
-        return getattr(self, '_supplement_class_cache')
+        return get_supplement_class()
 
     def get_activation_form_class(self):
         """Return the default form class used for user activation"""
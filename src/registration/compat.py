@@ -3,6 +3,7 @@
 Compatibility module
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+import sys
 from django.conf import settings
 
 try:
@@ -40,6 +41,33 @@ try:
 except ImportError:
     from django.utils.encoding import force_text as force_unicode
 
+
+def connect_setting_changed(receiver):
+    """connect ``receiver`` to ``setting_changed`` signal if it is available
+
+    ``setting_changed`` is not available in Django 1.3 thus nothing is
+    connected in that case; settings are not changed in runtime but by tests.
+
+    """
+    try:
+        from django.test.signals import setting_changed
+    except ImportError:
+        return
+    setting_changed.connect(receiver)
+
+
+def open_csv(filename):
+    """open ``filename`` for ``csv.reader``
+
+    ``csv`` of Python 2 reads bytes while ``csv`` of Python 3 reads text thus
+    the file is opened in binary mode in Python 2 and in UTF-8 text mode in
+    Python 3. Decode the values read with ``force_unicode``.
+
+    """
+    if sys.version_info >= (3,):
+        return open(filename, 'r', encoding='utf-8', newline='')
+    return open(filename, 'rb')
+
 #
 # Django change the transaction strategy from Django 1.6
 # https://docs.djangoproject.com/en/1.6/topics/db/transactions/
@@ -57,6 +85,48 @@ except ImportError:
     from django.db.transaction import commit_on_success as transaction_atomic
 
 
+
+def bulk_create(manager, objs):
+    """create ``objs`` with ``manager.bulk_create`` if it is available
+
+    ``bulk_create`` is not available in Django 1.3 thus each instance is
+    inserted one by one in that case.
+
+    """
+    if hasattr(manager, 'bulk_create'):
+        return manager.bulk_create(objs)
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
+
+
+def bulk_update(manager, objs, fields):
+    """update ``fields`` of ``objs`` with ``manager.bulk_update`` if it is
+    available
+
+    ``bulk_update`` is not available before Django 2.2 thus each instance is
+    updated by an ``UPDATE`` of ``fields`` only in that case. Call this in a
+    transaction to write all ``objs`` at once.
+
+    """
+    if hasattr(manager, 'bulk_update'):
+        return manager.bulk_update(objs, fields)
+    for obj in objs:
+        manager.filter(pk=obj.pk).update(**dict(
+            (field, getattr(obj, field)) for field in fields))
+
+try:
+    # Django 1.4+
+    from django.contrib.auth.hashers import make_password
+except ImportError:
+    def make_password(password):
+        """return hashed ``password`` via ``User.set_password``"""
+        from django.contrib.auth.models import User
+        user = User()
+        user.set_password(password)
+        return user.password
+
+
 # Custom User support section ==============================================={{{
 #
 # The following code (from === to ===) was copied from django-userena at
@@ -15,10 +15,25 @@ class InspectionalRegistrationAppConf(AppConf):
         'registration.admin.RegistrationSupplementAdminInlineBase')
     OPEN = True
 
+    CLEANUP_BATCH_SIZE = 500
+
+    SIGNED_ACTIVATION_KEY = False
+    INVALID_ACTIVATION_KEY_CACHE_TIMEOUT = 300
+    PASSWORD_HASHING_PROCESSES = None
+    COMPLETE_TOKEN = False
+    COMPLETE_TOKEN_MAX_AGE = 3600
+    AVAILABILITY_CACHE_TIMEOUT = 30
+    THROTTLES = {}
+
     #REGISTRATION_EMAIL = True
     ACCEPTANCE_EMAIL = True
     REJECTION_EMAIL = True
     ACTIVATION_EMAIL = True
+    EMAIL_OUTBOX = False
+    EMAIL_CONCURRENCY = 1
+    EMAIL_QUEUE_SIZE = 100
+    EMAIL_TIMEOUT = None
+    NONBLOCKING_VIEWS = False
 
     DJANGO_AUTH_URLS_ENABLE = True
     DJANGO_AUTH_URL_NAMES_PREFIX = ''
@@ -48,11 +48,29 @@ The notification email use the following templates in default
     .. Note::
         Newlies of the template will be removed.
 
+The decision whether the notification is enabled and the recipients
+(including the result of a function of ``REGISTRATION_NOTIFICATION_RECIPIENTS``)
+are cached for ``REGISTRATION_NOTIFICATION_CACHE_TIMEOUT`` seconds (``0`` to
+disable the cache).
+
 If you want to change the name of template, use following settings
 
 -   ``REGISTRATION_NOTIFICATION_EMAIL_TEMPLATE_NAME``
 -   ``REGISTRATION_NOTIFICATION_EMAIL_SUBJECT_TEMPLATE_NAME``
 
+Set seconds to ``REGISTRATION_NOTIFICATION_DIGEST_INTERVAL`` to enable the
+digest mode. In digest mode, a compact record of each registration is
+stored instead of sending a notification email and
+``flush_registration_notifications`` command (run it periodically e.g. from
+cron) sends a single digest of the recorded registrations per interval. The
+digest email use the following templates in default and ``entries`` (a list
+of ``NotificationDigestEntry``) and ``site`` are passed to them
+
+-   ``registration/notification_digest_email.txt``
+    (``REGISTRATION_NOTIFICATION_DIGEST_EMAIL_TEMPLATE_NAME``)
+-   ``registration/notification_digest_email_subject.txt``
+    (``REGISTRATION_NOTIFICATION_DIGEST_EMAIL_SUBJECT_TEMPLATE_NAME``)
+
     
 .. Note::
     This feature is not available in tests because default tests of 
@@ -65,17 +83,60 @@ If you want to change the name of template, use following settings
 """
 __author__ = "Alisue <lambdalisue@hashnote.net>"
 import sys
+import time
 from django.core.exceptions import ImproperlyConfigured
-from django.template.loader import render_to_string
 
+from registration.compat import force_unicode
+from registration.compat import connect_setting_changed
 from registration.utils import get_site
+from registration.utils import render_to_string
 from registration.utils import send_mail
 from registration.signals import user_registered
 from registration.contrib.notification.conf import settings
 
 
+_cache = {}
+
+
+def _cached(key, fn):
+    """call ``fn`` and cache the result for
+    ``REGISTRATION_NOTIFICATION_CACHE_TIMEOUT`` seconds in this process"""
+    timeout = settings.REGISTRATION_NOTIFICATION_CACHE_TIMEOUT
+    if not timeout:
+        return fn()
+    now = time.time()
+    cached = _cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    value = fn()
+    _cache[key] = (now + timeout, value)
+    return value
+
+
+def clear_notification_cache():
+    """clear the cached enable decision and recipients"""
+    _cache.clear()
+
+
+def _clear_notification_cache_receiver(sender, setting, **kwargs):
+    if (setting in ('ADMINS', 'MANAGERS') or
+            'REGISTRATION_NOTIFICATION' in setting):
+        clear_notification_cache()
+connect_setting_changed(_clear_notification_cache_receiver)
+
+
 def is_notification_enable():
-    """get whether the registration notification is enable"""
+    """get whether the registration notification is enable
+
+    The decision is cached for ``REGISTRATION_NOTIFICATION_CACHE_TIMEOUT``
+    seconds and the cache is cleared when related settings are changed
+    (``setting_changed`` signal).
+
+    """
+    return _cached('enable', _is_notification_enable)
+
+
+def _is_notification_enable():
     if not settings.REGISTRATION_NOTIFICATION:
         return False
     if 'test' in sys.argv and not getattr(settings,
@@ -102,24 +163,16 @@ def is_notification_enable():
     return True
 
 
-def send_notification_email_reciver(sender, user, profile, request, **kwargs):
-    """send a notification email to admins/managers"""
-    if not is_notification_enable():
-        return
+def get_notification_recipients():
+    """get a list of email addresses which notifications are sent to
 
-    context = {
-            'user': user,
-            'profile': profile,
-            'site': get_site(request),
-        }
-    subject = render_to_string(
-            settings.REGISTRATION_NOTIFICATION_EMAIL_SUBJECT_TEMPLATE_NAME,
-            context)
-    subject = "".join(subject.splitlines())
-    message = render_to_string(
-            settings.REGISTRATION_NOTIFICATION_EMAIL_TEMPLATE_NAME,
-            context)
+    The recipients are cached as ``is_notification_enable``.
 
+    """
+    return list(_cached('recipients', _get_notification_recipients))
+
+
+def _get_notification_recipients():
     recipients = []
     if settings.REGISTRATION_NOTIFICATION_ADMINS:
         for userinfo in settings.ADMINS:
@@ -140,7 +193,95 @@ def send_notification_email_reciver(sender, user, profile, request, **kwargs):
                     'a list of recipients (Currently the value was "%s")'
                     ) % method_or_iterable)
     # remove duplications
-    recipients = frozenset(recipients)
+    return list(frozenset(recipients))
+
+
+def send_notification_email_reciver(sender, user, profile, request, **kwargs):
+    """send a notification email to admins/managers
+
+    In digest mode, only a ``NotificationDigestEntry`` is created and the
+    notification is sent later by ``send_notification_digest``
+
+    """
+    if not is_notification_enable():
+        return
+
+    if settings.REGISTRATION_NOTIFICATION_DIGEST_INTERVAL:
+        from registration.compat import datetime_now
+        from registration.contrib.notification.models import \
+                NotificationDigestEntry
+        NotificationDigestEntry.objects.create(
+            profile_id=profile.pk if profile else None,
+            username=force_unicode(user),
+            email=user.email,
+            created_at=datetime_now())
+        return
+
+    context = {
+            'user': user,
+            'profile': profile,
+            'site': get_site(request),
+        }
+    subject = render_to_string(
+            settings.REGISTRATION_NOTIFICATION_EMAIL_SUBJECT_TEMPLATE_NAME,
+            context)
+    subject = "".join(subject.splitlines())
+    message = render_to_string(
+            settings.REGISTRATION_NOTIFICATION_EMAIL_TEMPLATE_NAME,
+            context)
+
+    recipients = get_notification_recipients()
 
     send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipients)
 user_registered.connect(send_notification_email_reciver)
+
+
+def send_notification_digest(force=False, site=None):
+    """send a digest of registrations recorded in digest mode
+
+    The digest is sent when the oldest entry is older than
+    ``REGISTRATION_NOTIFICATION_DIGEST_INTERVAL`` seconds (or ``force`` is
+    ``True``) thus at most one digest is sent per interval. The entries
+    listed in the digest are deleted. Returning the number of listed
+    entries.
+
+    The digest is sent out of any request thus ``site`` is required when
+    ``django.contrib.sites`` is not installed; the current ``Site`` is used
+    when it is ``None``.
+
+    """
+    import datetime
+    from registration.compat import datetime_now
+    from registration.contrib.notification.models import \
+            NotificationDigestEntry
+    from django.contrib.sites.models import Site
+    if site is None:
+        if not Site._meta.installed:
+            raise ValueError('site is required when django.contrib.sites '
+                             'is not installed')
+        site = Site.objects.get_current()
+    entries = list(NotificationDigestEntry.objects.all())
+    if not entries:
+        return 0
+    interval = settings.REGISTRATION_NOTIFICATION_DIGEST_INTERVAL or 0
+    if not force and entries[0].created_at > datetime_now() - \
+            datetime.timedelta(seconds=interval):
+        return 0
+
+    context = {
+            'entries': entries,
+            'site': site,
+        }
+    subject = render_to_string(
+            settings.REGISTRATION_NOTIFICATION_DIGEST_EMAIL_SUBJECT_TEMPLATE_NAME,
+            context)
+    subject = "".join(subject.splitlines())
+    message = render_to_string(
+            settings.REGISTRATION_NOTIFICATION_DIGEST_EMAIL_TEMPLATE_NAME,
+            context)
+    recipients = get_notification_recipients()
+    if recipients:
+        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipients)
+    # entries created while sending are kept for the next digest
+    NotificationDigestEntry.objects.filter(pk__lte=entries[-1].pk).delete()
+    return len(entries)
@@ -11,11 +11,18 @@ class InspectionalRegistrationNotificationAppConf(AppConf):
     NOTIFICATION_ADMINS = True
     NOTIFICATION_MANAGERS = True
     NOTIFICATION_RECIPIENTS = None
+    NOTIFICATION_CACHE_TIMEOUT = 300
 
     NOTIFICATION_EMAIL_TEMPLATE_NAME = (
             r'registration/notification_email.txt')
     NOTIFICATION_EMAIL_SUBJECT_TEMPLATE_NAME = (
             r'registration/notification_email_subject.txt')
 
+    NOTIFICATION_DIGEST_INTERVAL = None
+    NOTIFICATION_DIGEST_EMAIL_TEMPLATE_NAME = (
+            r'registration/notification_digest_email.txt')
+    NOTIFICATION_DIGEST_EMAIL_SUBJECT_TEMPLATE_NAME = (
+            r'registration/notification_digest_email_subject.txt')
+
     class Meta:
         prefix = 'registration'
@@ -0,0 +1,48 @@
+# coding=utf-8
+"""
+A management command which sends a digest of registration notifications.
+
+This command is used in digest mode of ``registration.contrib.notification``
+(``REGISTRATION_NOTIFICATION_DIGEST_INTERVAL``). Run this command
+periodically (e.g. from cron); a digest is sent only when the oldest recorded
+registration is older than the interval, thus at most one digest is sent per
+interval.
+
+The site in the digest is the current ``Site`` or ``--domain``, which is
+required when ``django.contrib.sites`` is not installed.
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+from optparse import make_option
+from django.contrib.sites.models import Site
+from django.core.management.base import NoArgsCommand
+from django.core.management.base import CommandError
+
+from registration.contrib.notification import send_notification_digest
+
+
+class Command(NoArgsCommand):
+    help = "Send a digest of registration notifications"
+    option_list = NoArgsCommand.option_list + (
+        make_option('--force', action='store_true', dest='force',
+                    default=False,
+                    help='Send a digest even if the interval has not '
+                         'passed.'),
+        make_option('--domain', dest='domain', default=None,
+                    help='The domain of the site used in the digest '
+                         'instead of the current Site.'),
+    )
+
+    def handle_noargs(self, **options):
+        domain = options.get('domain')
+        if domain:
+            # like ``RequestSite``, an unsaved ``Site`` is used
+            site = Site(domain=domain, name=domain)
+        elif Site._meta.installed:
+            site = Site.objects.get_current()
+        else:
+            raise CommandError('--domain is required when '
+                               'django.contrib.sites is not installed')
+        count = send_notification_digest(force=options.get('force', False),
+                                         site=site)
+        if int(options.get('verbosity', 1)) >= 1:
+            self.stdout.write('Sent a digest of %d registrations\n' % count)
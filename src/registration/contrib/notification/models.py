@@ -1 +1,32 @@
-# fake
+# coding=utf-8
+"""
+Models of registration notification
+
+``NotificationDigestEntry`` is used only in digest mode (see
+``REGISTRATION_NOTIFICATION_DIGEST_INTERVAL``)
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+from django.db import models
+from django.utils.text import ugettext_lazy as _
+
+
+class NotificationDigestEntry(models.Model):
+    """A compact record of a new registration waiting for the next digest
+
+    The values are copied from the registration thus the entry is kept
+    even if the registration is deleted before the digest is sent.
+
+    """
+    profile_id = models.IntegerField(_('registration profile id'),
+                                     null=True)
+    username = models.CharField(_('username'), max_length=255)
+    email = models.CharField(_('email'), max_length=255, blank=True)
+    created_at = models.DateTimeField(_('created date'), db_index=True)
+
+    class Meta:
+        verbose_name = _('notification digest entry')
+        verbose_name_plural = _('notification digest entries')
+        ordering = ('pk',)
+
+    def __unicode__(self):
+        return self.username
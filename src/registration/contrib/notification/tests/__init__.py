@@ -4,10 +4,15 @@
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
 from django.test import TestCase
 from django.conf import settings
+import datetime
+from StringIO import StringIO
 from django.core import mail
+from django.core import management
 from registration.backends.default import DefaultRegistrationBackend
 from registration.tests.mock import mock_request
 from registration.tests.compat import override_settings
+from registration.compat import datetime_now
+from registration.contrib.notification.models import NotificationDigestEntry
 
 
 @override_settings(
@@ -158,3 +163,87 @@ class RegistrationNotificationTestCase(TestCase):
                     'recipient1@test.com',
                     'recipient2@test.com',
                 ]))
+
+    def test_notify_digest(self):
+        with override_settings(
+            REGISTRATION_NOTIFICATION_DIGEST_INTERVAL=3600,
+            REGISTRATION_NOTIFICATION_MANAGERS=False):
+            self.backend.register(
+                    'bob', 'bob@test.com', request=self.mock_request
+                )
+            self.backend.register(
+                    'alice', 'alice@test.com', request=self.mock_request
+                )
+            self.assertEqual(len(mail.outbox), 0)
+            self.assertEqual(NotificationDigestEntry.objects.count(), 2)
+
+            # the interval has not passed yet
+            management.call_command('flush_registration_notifications',
+                                    stdout=StringIO())
+            self.assertEqual(len(mail.outbox), 0)
+
+            NotificationDigestEntry.objects.update(
+                created_at=datetime_now() - datetime.timedelta(hours=2))
+            management.call_command('flush_registration_notifications',
+                                    stdout=StringIO())
+            self.assertEqual(len(mail.outbox), 1)
+            self.assertEqual(sorted(mail.outbox[0].to), sorted([
+                    'admin1@test.com',
+                    'admin2@test.com',
+                ]))
+            self.failUnless('bob@test.com' in mail.outbox[0].body)
+            self.failUnless('alice@test.com' in mail.outbox[0].body)
+            self.assertEqual(NotificationDigestEntry.objects.count(), 0)
+
+            # nothing to send
+            management.call_command('flush_registration_notifications',
+                                    force=True, stdout=StringIO())
+            self.assertEqual(len(mail.outbox), 1)
+
+    def test_notify_digest_domain(self):
+        with override_settings(
+            REGISTRATION_NOTIFICATION_DIGEST_INTERVAL=3600,
+            REGISTRATION_NOTIFICATION_MANAGERS=False):
+            self.backend.register(
+                    'bob', 'bob@test.com', request=self.mock_request
+                )
+            management.call_command('flush_registration_notifications',
+                                    force=True, domain='testserver.example',
+                                    stdout=StringIO())
+            self.assertEqual(len(mail.outbox), 1)
+            self.failUnless('http://testserver.example/' in
+                            mail.outbox[0].body)
+            self.failUnless('testserver.example' in mail.outbox[0].subject)
+
+    def test_recipients_are_cached(self):
+        calls = []
+
+        def recipients():
+            calls.append(1)
+            return ['recipient1@test.com']
+
+        with override_settings(
+            REGISTRATION_NOTIFICATION_ADMINS=False,
+            REGISTRATION_NOTIFICATION_MANAGERS=False,
+            REGISTRATION_NOTIFICATION_RECIPIENTS=recipients):
+            self.backend.register(
+                    'bob', 'bob@test.com', request=self.mock_request
+                )
+            self.backend.register(
+                    'alice', 'alice@test.com', request=self.mock_request
+                )
+            self.assertEqual(len(mail.outbox), 2)
+            self.assertEqual(len(calls), 1)
+
+            # changing settings clears the cache
+            with override_settings(
+                    REGISTRATION_NOTIFICATION_ADMINS=True):
+                self.backend.register(
+                        'carol', 'carol@test.com', request=self.mock_request
+                    )
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(sorted(mail.outbox[2].to), sorted([
+                    'admin1@test.com',
+                    'admin2@test.com',
+                    'recipient1@test.com',
+                ]))
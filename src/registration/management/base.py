@@ -0,0 +1,117 @@
+# coding=utf-8
+"""
+Base class of cleanup management commands
+
+The cleanup commands delete registrations in small batches, each batch in its
+own transaction, thus they can be executed next to live signup traffic.
+Each batch reports the number of registrations, the throughput (rows/s)
+and the watermark (use ``--verbosity=0`` to silence it).
+The following options are available in all cleanup commands
+
+``--batch-size``
+    The number of registrations deleted in a single transaction
+    (``REGISTRATION_CLEANUP_BATCH_SIZE`` by default)
+
+``--max-runtime``
+    Stop after the batch which exceeded this number of seconds
+
+``--sleep-between-batches``
+    Sleep this number of seconds between batches
+
+``--dry-run``
+    Report the registrations which would be deleted without deleting them
+
+``--start-after``
+    Resume from the watermark (the primary key of the last processed
+    registration) reported by an interrupted run
+
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+import time
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+
+from registration.models import RegistrationProfile
+
+
+class CleanupCommandBase(NoArgsCommand):
+    """Base class of cleanup management commands
+
+    Subclasses must define ``get_queryset`` which return a queryset of
+    ``RegistrationProfile`` to be deleted with their associated ``User``.
+
+    """
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=None,
+                    help='The number of registrations deleted in a single '
+                         'transaction.'),
+        make_option('--max-runtime', type='float', dest='max_runtime',
+                    default=None,
+                    help='Stop after the batch which exceeded this number '
+                         'of seconds.'),
+        make_option('--sleep-between-batches', type='float',
+                    dest='sleep_between_batches', default=0,
+                    help='Sleep this number of seconds between batches.'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Report the registrations which would be deleted '
+                         'without deleting them.'),
+        make_option('--start-after', type='int', dest='start_after',
+                    default=None,
+                    help='Resume from the watermark reported by an '
+                         'interrupted run.'),
+    )
+
+    def get_queryset(self):
+        """get a queryset of ``RegistrationProfile`` to be deleted"""
+        raise NotImplementedError
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+        max_runtime = options.get('max_runtime')
+        sleep_between_batches = options.get('sleep_between_batches') or 0
+        dry_run = options.get('dry_run', False)
+        watermark = options.get('start_after')
+
+        batches = RegistrationProfile.objects.delete_users_in_batches(
+            self.get_queryset(),
+            batch_size=options.get('batch_size'),
+            start_after=watermark,
+            dry_run=dry_run)
+
+        total = 0
+        interrupted = False
+        started = batch_started = time.time()
+        for count, watermark in batches:
+            now = time.time()
+            total += count
+            if verbosity >= 1:
+                self.stdout.write(
+                    '%s %d registrations in %.2fs (%.1f rows/s), '
+                    'watermark %s\n' % (
+                        'Found' if dry_run else 'Deleted',
+                        count, now - batch_started,
+                        self._rate(count, now - batch_started),
+                        watermark))
+            if max_runtime is not None and now - started >= max_runtime:
+                interrupted = True
+                break
+            if sleep_between_batches:
+                time.sleep(sleep_between_batches)
+            batch_started = time.time()
+
+        elapsed = time.time() - started
+        if verbosity >= 1:
+            self.stdout.write('%s %d registrations in %.2fs (%.1f rows/s)\n' % (
+                'Found' if dry_run else 'Deleted',
+                total, elapsed, self._rate(total, elapsed)))
+        if interrupted and verbosity >= 1:
+            self.stdout.write(
+                'Stopped by --max-runtime. Resume with '
+                '--start-after=%s\n' % watermark)
+
+    def _rate(self, count, elapsed):
+        if elapsed <= 0:
+            return float(count)
+        return count / elapsed
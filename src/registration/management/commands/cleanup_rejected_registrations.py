@@ -3,9 +3,9 @@
 A management command which deletes expired or rejected accounts (e.g.,
 accounts which signed up but never activated) from the database.
 
-Calls ``RegistrationProfile.objects.delete_expired_users()`` and
-``RegistrationProfile.objects.delete_rejected_users()``, which
+Calls ``RegistrationProfile.objects.get_rejected_profiles()``, which
 contains the actual logic for determining which accounts are deleted.
+See ``registration.management.base`` for the available options.
 
 This is a modification of django-registration_ ``cleanupregistration.py``
 The original code is written by James Bennett
@@ -45,12 +45,12 @@ Original License::
     OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
-from django.core.management.base import NoArgsCommand
 from registration.models import RegistrationProfile
+from registration.management.base import CleanupCommandBase
 
 
-class Command(NoArgsCommand):
+class Command(CleanupCommandBase):
     help = "Delete rejected user registrations from the database"
 
-    def handle_noargs(self, **options):
-        RegistrationProfile.objects.delete_rejected_users()
+    def get_queryset(self):
+        return RegistrationProfile.objects.get_rejected_profiles()
@@ -0,0 +1,61 @@
+# coding=utf-8
+"""
+A management command which accepts and activates registrations forcibly.
+
+The registrations are specified by the usernames or by ``--status``. Users
+are activated with generated passwords through
+``force_activate_many()`` of the current registration backend, thus users
+are written in bulk and the activation emails are sent in batches. The
+passwords are hashed on a pool of ``--processes`` processes (default
+``REGISTRATION_PASSWORD_HASHING_PROCESSES``) when it is more than ``1``.
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from registration.conf import settings
+from registration.compat import get_user_model
+from registration.backends import get_backend
+from registration.models import RegistrationProfile
+
+
+class Command(BaseCommand):
+    args = '<username username ...>'
+    help = "Accept and activate registrations forcibly"
+    option_list = BaseCommand.option_list + (
+        make_option('--status', dest='status', default=None,
+                    choices=('untreated', 'accepted', 'rejected'),
+                    help='Activate all registrations in the status '
+                         '(untreated, accepted or rejected).'),
+        make_option('--no-email', action='store_false', dest='send_email',
+                    default=None,
+                    help='Do not send activation emails.'),
+        make_option('--processes', type='int', dest='processes',
+                    default=None,
+                    help='The number of processes used to hash passwords. '
+                         'Passwords are hashed in this process by default.'),
+    )
+
+    def handle(self, *args, **options):
+        status = options.get('status')
+        if not args and not status:
+            raise CommandError('Specify usernames or --status.')
+        queryset = RegistrationProfile.objects.all()
+        if args:
+            username_field = getattr(
+                get_user_model(), 'USERNAME_FIELD', 'username')
+            queryset = queryset.filter(**{
+                'user__%s__in' % username_field: args,
+            })
+        if status:
+            queryset = queryset.filter(_status=status)
+        backend = get_backend()
+        processes = options.get('processes')
+        if processes is None:
+            processes = settings.REGISTRATION_PASSWORD_HASHING_PROCESSES
+        users = backend.force_activate_many(
+            queryset, request=None, send_email=options.get('send_email'),
+            processes=processes)
+        if int(options.get('verbosity', 1)) >= 1:
+            self.stdout.write('Activated %d users\n' % len(users))
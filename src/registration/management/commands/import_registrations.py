@@ -0,0 +1,78 @@
+# coding=utf-8
+"""
+A management command which registers users listed in a CSV file.
+
+Each row of the CSV file is ``username,email`` (a header row with exactly
+these names is skipped). The file is streamed into
+``RegistrationProfile.objects.bulk_register()`` thus even a large file is
+registered in a constant memory. Use ``-`` to read the CSV from the
+standard input.
+
+The registered users are untreated registrations, exactly same as the users
+registered in the registration view.
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+import sys
+import csv
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.contrib.sites.models import Site
+
+from registration.compat import open_csv
+from registration.compat import force_unicode
+from registration.models import RegistrationProfile
+
+
+class Command(BaseCommand):
+    args = '<csv_file>'
+    help = "Register users listed in a CSV file of username and email"
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=500,
+                    help='The number of users registered in a single '
+                         'transaction.'),
+        make_option('--no-email', action='store_false', dest='send_email',
+                    default=True,
+                    help='Do not send registration emails.'),
+    )
+
+    def iter_rows(self, fi):
+        for i, row in enumerate(csv.reader(fi)):
+            if not row:
+                continue
+            if len(row) != 2:
+                raise CommandError(
+                    'Line %d: expected "username,email" but got %d '
+                    'columns' % (i + 1, len(row)))
+            username, email = [force_unicode(x.strip()) for x in row]
+            if i == 0 and (username, email) == ('username', 'email'):
+                # header
+                continue
+            yield username, email
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: import_registrations %s' % self.args)
+        send_email = options.get('send_email', True)
+        if Site._meta.installed:
+            site = Site.objects.get_current()
+        elif send_email:
+            raise CommandError('"django.contrib.sites" is required to send '
+                               'registration emails.')
+        else:
+            site = None
+        if args[0] == '-':
+            fi = sys.stdin
+        else:
+            fi = open_csv(args[0])
+        try:
+            registered = RegistrationProfile.objects.bulk_register(
+                self.iter_rows(fi), site,
+                send_email=send_email,
+                batch_size=options.get('batch_size') or 500)
+        finally:
+            if fi is not sys.stdin:
+                fi.close()
+        if int(options.get('verbosity', 1)) >= 1:
+            self.stdout.write('Registered %d users\n' % registered)
@@ -0,0 +1,68 @@
+# coding=utf-8
+"""
+A management command which sends emails queued in ``EmailOutbox``.
+
+Emails of registrations are queued in ``EmailOutbox`` when
+``REGISTRATION_EMAIL_OUTBOX`` is ``True``. Run this command periodically
+(e.g. from cron) to send them. Emails are sent in batches, each batch over a
+single connection of ``EMAIL_BACKEND``. Failed emails are retried with an
+exponential backoff and marked as dead after ``--max-attempts`` failures.
+Emails are claimed before being sent thus overlapping runs of this command
+do not send the same email twice.
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+
+from registration.compat import datetime_now
+from registration.models import EmailOutbox
+
+
+class Command(NoArgsCommand):
+    help = "Send emails queued in the registration outbox"
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=100,
+                    help='The number of emails sent over a single '
+                         'connection.'),
+        make_option('--max-attempts', type='int', dest='max_attempts',
+                    default=5,
+                    help='The number of failures before an email is marked '
+                         'as dead.'),
+        make_option('--backoff', type='float', dest='backoff', default=60,
+                    help='Seconds before the first retry of a failed '
+                         'email. It is doubled on each retry.'),
+        make_option('--lease', type='int', dest='lease', default=600,
+                    help='Seconds an email claimed by this command is '
+                         'hidden from other senders. It should be longer '
+                         'than sending a batch takes.'),
+        make_option('--requeue-dead', action='store_true',
+                    dest='requeue_dead', default=False,
+                    help='Queue dead emails again before sending.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+        if options.get('requeue_dead'):
+            requeued = EmailOutbox.objects.filter(status='dead').update(
+                status='pending', attempts=0, next_attempt_at=datetime_now())
+            if verbosity >= 1:
+                self.stdout.write('Requeued %d dead emails\n' % requeued)
+        total_sent = total_failed = total_dead = 0
+        while True:
+            sent, failed, dead = EmailOutbox.objects.send_batch(
+                batch_size=options.get('batch_size') or 100,
+                max_attempts=options.get('max_attempts') or 5,
+                backoff=options.get('backoff') or 0,
+                lease=options.get('lease') or 600)
+            if not (sent or failed or dead):
+                break
+            total_sent += sent
+            total_failed += failed
+            total_dead += dead
+            if verbosity >= 2:
+                self.stdout.write('Sent %d, failed %d, dead %d\n' % (
+                    sent, failed, dead))
+        if verbosity >= 1:
+            self.stdout.write('Sent %d emails (%d failed, %d dead)\n' % (
+                total_sent, total_failed, total_dead))
@@ -49,22 +49,34 @@ __all__ = (
 )
 import re
 import datetime
+from itertools import islice
 
 from django.db import models
+from django.db import connections
+from django.db.models.query import QuerySet
 from django.contrib.sites.models import Site
-from django.template.loader import render_to_string
-from django.core.exceptions import ObjectDoesNotExist
 from django.utils.text import ugettext_lazy as _
 
 from registration.conf import settings
 from registration.compat import get_user_model
 from registration.compat import user_model_label
 from registration.compat import datetime_now
+from registration.compat import force_unicode
 from registration.utils import generate_activation_key
+from registration.utils import generate_signed_activation_key
+from registration.utils import validate_activation_key
+from registration.utils import forget_invalid_activation_keys
 from registration.utils import generate_random_password
+from registration.utils import make_passwords
 from registration.utils import send_mail
+from registration.utils import send_mass_mail
+from registration.utils import render_many
+from registration.utils import email_connection_pool
 from registration.supplements import get_supplement_class
 from registration.compat import transaction_atomic
+from registration.compat import bulk_create
+from registration.compat import make_password
+from registration.compat import bulk_update
 
 from logging import getLogger
 logger = getLogger(__name__)
@@ -72,6 +84,90 @@ logger = getLogger(__name__)
 SHA1_RE = re.compile(r'^[a-f0-9]{40}$')
 
 
+def _send_mass_mail(datatuple):
+    """send emails in ``datatuple`` or queue them in ``EmailOutbox`` when
+    ``REGISTRATION_EMAIL_OUTBOX`` is ``True``"""
+    if settings.REGISTRATION_EMAIL_OUTBOX:
+        return EmailOutbox.objects.enqueue(datatuple)
+    return send_mass_mail(datatuple)
+
+
+def _render_emails(site, action, items):
+    """render the emails of ``action`` for ``items``
+
+    ``items`` is a list of ``(profile, extra_context)``. The subject and body
+    templates of ``action`` are compiled once and rendered for all items.
+    Returning a list of ``(subject, message, from_email, recipient_list)``.
+
+    """
+    contexts = [profile._get_email_context(site, action, extra_context)
+                for profile, extra_context in items]
+    subjects = render_many(
+        'registration/%s_email_subject.txt' % action, contexts)
+    messages = render_many('registration/%s_email.txt' % action, contexts)
+    return [(''.join(subject.splitlines()), message,
+             settings.DEFAULT_FROM_EMAIL, [profile.user.email])
+            for (profile, extra_context), subject, message
+            in zip(items, subjects, messages)]
+
+
+def _generate_activation_key(pk, username, expires_at):
+    """generate a signed activation key when
+    ``REGISTRATION_SIGNED_ACTIVATION_KEY`` is ``True`` and ``pk`` is
+    available, otherwise a SHA1 activation key"""
+    if settings.REGISTRATION_SIGNED_ACTIVATION_KEY and pk is not None:
+        return generate_signed_activation_key(pk, expires_at)
+    return generate_activation_key(username)
+
+
+class RegistrationProfileQuerySet(QuerySet):
+    """Custom queryset for the ``RegistrationProfile`` model.
+
+    The methods defined here filter or annotate profiles by the effective
+    status (the inspection status with ``'expired'`` for accepted profiles
+    whose activation key has expired) in the database. These methods are
+    chainable and also available on ``RegistrationProfile.objects``.
+
+    """
+    def untreated(self):
+        """filter profiles which have not been inspected yet"""
+        return self.filter(_status='untreated')
+
+    def accepted(self):
+        """filter accepted profiles whose activation key has not expired"""
+        return self.filter(_status='accepted').exclude(
+            expires_at__lte=datetime_now())
+
+    def expired(self):
+        """filter accepted profiles whose activation key has expired"""
+        return self.filter(_status='accepted',
+                           expires_at__lte=datetime_now())
+
+    def rejected(self):
+        """filter rejected profiles"""
+        return self.filter(_status='rejected')
+
+    def with_effective_status(self):
+        """annotate the effective status as ``effective_status``
+
+        The value is one of ``'untreated'``, ``'accepted'``, ``'rejected'``
+        or ``'expired'`` and is determined by SQL ``CASE`` expression thus
+        it can be used in ``order_by`` and ``values`` as well.
+
+        """
+        qn = connections[self.db].ops.quote_name
+        opts = self.model._meta
+        column = lambda name: '%s.%s' % (
+            qn(opts.db_table), qn(opts.get_field(name).column))
+        sql = ("CASE WHEN %(status)s = 'accepted' AND %(expires_at)s <= %%s "
+               "THEN 'expired' ELSE %(status)s END") % {
+                   'status': column('_status'),
+                   'expires_at': column('expires_at'),
+               }
+        return self.extra(select={'effective_status': sql},
+                          select_params=(datetime_now(),))
+
+
 class RegistrationManager(models.Manager):
     """Custom manager for the ``RegistrationProfile`` model.
 
@@ -80,7 +176,31 @@ class RegistrationManager(models.Manager):
     (including generation and emailing of activation keys), and for cleaning out
     expired/rejected inactive accounts.
 
+    The queryset of this manager is ``RegistrationProfileQuerySet`` thus the
+    effective status filters (``untreated``, ``accepted``, ``expired``,
+    ``rejected`` and ``with_effective_status``) are available as well.
+
     """
+    def get_queryset(self):
+        return RegistrationProfileQuerySet(self.model, using=self._db)
+    # Django < 1.6
+    get_query_set = get_queryset
+
+    def untreated(self):
+        return self.get_queryset().untreated()
+
+    def accepted(self):
+        return self.get_queryset().accepted()
+
+    def expired(self):
+        return self.get_queryset().expired()
+
+    def rejected(self):
+        return self.get_queryset().rejected()
+
+    def with_effective_status(self):
+        return self.get_queryset().with_effective_status()
+
     @transaction_atomic
     def register(self, username, email, site, send_email=True):
         """register new user with ``username`` and ``email``
@@ -100,11 +220,9 @@ class RegistrationManager(models.Manager):
         method, the newly created user will be rollbacked.
 
         """
-        User = get_user_model()
-        new_user = User.objects.create_user(username, email, 'password')
-        new_user.set_unusable_password()
-        new_user.is_active = False
-        new_user.save()
+        new_user = self._build_inactive_user(username, email)
+        # a single INSERT without hashing a dummy password
+        new_user.save(force_insert=True)
 
         profile = self.create(user=new_user)
 
@@ -113,6 +231,84 @@ class RegistrationManager(models.Manager):
 
         return new_user
 
+    def _build_inactive_user(self, username, email):
+        """build an unsaved, inactive ``User`` without usable password
+
+        ``create_user`` is not used because it hashes a password which is
+        discarded immediately.
+
+        """
+        User = get_user_model()
+        username_field = getattr(User, 'USERNAME_FIELD', 'username')
+        normalize_email = getattr(User.objects, 'normalize_email', None)
+        if normalize_email:
+            email = normalize_email(email)
+        new_user = User(**{username_field: username, 'email': email})
+        new_user.set_unusable_password()
+        new_user.is_active = False
+        return new_user
+
+    def bulk_register(self, users, site, send_email=True, batch_size=500):
+        """register new users in bulk
+
+        Create new, inactive ``User`` and ``RegistrationProfile`` for each
+        ``(username, email)`` in the iterable ``users``, returning the number
+        of registered users. It is designed for mass imports thus ``users``
+        is consumed lazily and processed in batches of ``batch_size``.
+
+        Each batch is registered in its own transaction with two
+        ``bulk_create`` (for ``User`` and ``RegistrationProfile``) and the
+        registration emails of the batch are sent together over a single
+        connection with ``registration.utils.send_mass_mail``. To disable the
+        registration emails, pass ``send_email=False``.
+
+        Usernames which are already in use (or appeared earlier in
+        ``users``) are skipped.
+
+        """
+        users = iter(users)
+        registered = 0
+        # share the email connection among batches
+        with email_connection_pool():
+            while True:
+                batch = list(islice(users, batch_size))
+                if not batch:
+                    return registered
+                registered += self._bulk_register_batch(batch, site, send_email)
+
+    @transaction_atomic
+    def _bulk_register_batch(self, batch, site, send_email):
+        User = get_user_model()
+        username_field = getattr(User, 'USERNAME_FIELD', 'username')
+        usernames = [username for username, email in batch]
+        seen = set(User.objects.filter(**{
+            '%s__in' % username_field: usernames,
+        }).values_list(username_field, flat=True))
+
+        new_users = []
+        for username, email in batch:
+            if username in seen:
+                continue
+            seen.add(username)
+            new_users.append(self._build_inactive_user(username, email))
+        if not new_users:
+            return 0
+        bulk_create(User.objects, new_users)
+
+        # bulk_create does not set the primary keys thus fetch them
+        user_pks = list(User.objects.filter(**{
+            '%s__in' % username_field: [
+                getattr(new_user, username_field) for new_user in new_users],
+        }).values_list('pk', flat=True))
+        bulk_create(self, [self.model(user_id=pk) for pk in user_pks])
+
+        if send_email:
+            profiles = self.filter(user__in=user_pks).select_related('user')
+            _send_mass_mail(_render_emails(
+                site, 'registration',
+                [(profile, None) for profile in profiles]))
+        return len(new_users)
+
     @transaction_atomic
     def accept_registration(self, profile, site,
                             send_email=True, message=None, force=False):
@@ -136,19 +332,162 @@ class RegistrationManager(models.Manager):
         be generated.
 
         """
-        # rejected -> accepted is allowed
-        if force or profile.status in ('untreated', 'rejected'):
-            if force:
-                # removing activation_key will force to create a new one
-                profile.activation_key = None
-            profile.status = 'accepted'
-            profile.save()
+        User = get_user_model()
+        now = datetime_now()
+        expires_at = now + datetime.timedelta(
+                days=settings.ACCOUNT_ACTIVATION_DAYS)
+        user = profile.user
+        activation_key = self._accept_profile(
+            profile.pk, user.username, expires_at, force)
+        if activation_key is None:
+            return None
+        User.objects.filter(pk=user.pk).update(date_joined=now)
+        # reflect the new state to the instances
+        user.date_joined = now
+        profile._status = 'accepted'
+        profile.activation_key = activation_key
+        profile.expires_at = expires_at
 
-            if send_email:
-                profile.send_acceptance_email(site, message=message)
+        if send_email:
+            profile.send_acceptance_email(site, message=message)
 
-            return profile.user
-        return None
+        return user
+
+    def _accept_profile(self, pk, username, expires_at, force=False):
+        """accept the profile with a conditional update
+
+        The status transition is done in a single ``UPDATE`` statement with
+        the allowed source statuses in ``WHERE`` clause, thus concurrent
+        inspectors never overwrite each other. Return the new activation key
+        when the profile has accepted, otherwise ``None``.
+
+        """
+        queryset = self.filter(pk=pk)
+        if not force:
+            # rejected -> accepted is allowed
+            queryset = queryset.filter(_status__in=('untreated', 'rejected'))
+        activation_key = _generate_activation_key(pk, username, expires_at)
+        updated = queryset.update(
+            _status='accepted',
+            activation_key=activation_key,
+            expires_at=expires_at)
+        if not updated:
+            return None
+        forget_invalid_activation_keys([activation_key])
+        return activation_key
+
+    def accept_many(self, queryset, site, send_email=True, message=None,
+                    force=False, batch_size=500):
+        """accept account registrations of profiles in ``queryset`` in bulk
+
+        This is a bulk version of ``accept_registration`` thus profiles which
+        have already been accepted are ignored unless ``force`` is ``True``.
+        Returning a list of accepted ``RegistrationProfile`` (with their
+        ``User``).
+
+        Profiles are accepted in batches of ``batch_size``, each batch in its
+        own transaction. In a batch, the status, the activation key and the
+        expiration date of each profile are written by a conditional
+        ``UPDATE``, ``date_joined`` of all accepted users is written by a
+        single ``UPDATE`` and the acceptance emails are sent together over
+        a single connection with ``registration.utils.send_mass_mail``.
+
+        """
+        if not force:
+            queryset = queryset.filter(_status__in=('untreated', 'rejected'))
+        rows = list(queryset.values_list('pk', 'user', 'user__username'))
+        accepted = []
+        # share the email connection among batches
+        with email_connection_pool():
+            for i in range(0, len(rows), batch_size):
+                accepted.extend(self._accept_batch(
+                    rows[i:i+batch_size], site, send_email, message, force))
+        return accepted
+
+    @transaction_atomic
+    def _accept_batch(self, rows, site, send_email, message, force):
+        User = get_user_model()
+        now = datetime_now()
+        expires_at = now + datetime.timedelta(
+                days=settings.ACCOUNT_ACTIVATION_DAYS)
+        accepted_pks = []
+        user_pks = []
+        for pk, user_pk, username in rows:
+            if self._accept_profile(pk, username, expires_at, force):
+                accepted_pks.append(pk)
+                user_pks.append(user_pk)
+        if not accepted_pks:
+            return []
+        User.objects.filter(pk__in=user_pks).update(date_joined=now)
+
+        profiles = list(self.filter(pk__in=accepted_pks).select_related('user'))
+        if send_email:
+            _send_mass_mail(_render_emails(site, 'acceptance', [
+                (profile, profile._get_acceptance_email_context(message))
+                for profile in profiles]))
+        return profiles
+
+    def send_acceptance_emails(self, profiles, site, message=None):
+        """send acceptance emails to the users of ``profiles`` in a batch
+
+        Profiles which have been rejected or have expired are ignored.
+        Returning a list of the profiles which the emails are sent to.
+
+        """
+        profiles = [profile for profile in profiles
+                    if profile.status in ('untreated', 'accepted')]
+        if profiles:
+            with email_connection_pool():
+                _send_mass_mail(_render_emails(site, 'acceptance', [
+                    (profile, profile._get_acceptance_email_context(message))
+                    for profile in profiles]))
+        return profiles
+
+    def reject_many(self, queryset, site, send_email=True, message=None,
+                    batch_size=500):
+        """reject account registrations of profiles in ``queryset`` in bulk
+
+        This is a bulk version of ``reject_registration`` thus only untreated
+        profiles are rejected. Returning a list of rejected
+        ``RegistrationProfile`` (with their ``User``).
+
+        Profiles are rejected in batches of ``batch_size``, each batch in its
+        own transaction. Like ``accept_many``, each profile is rejected by a
+        conditional ``UPDATE`` thus profiles rejected concurrently are not
+        returned twice. The rejection
+        emails of a batch are sent together over a single connection with
+        ``registration.utils.send_mass_mail``.
+
+        """
+        # accepted -> rejected is not allowed
+        pks = list(queryset.filter(
+            _status='untreated').values_list('pk', flat=True))
+        rejected = []
+        # share the email connection among batches
+        with email_connection_pool():
+            for i in range(0, len(pks), batch_size):
+                rejected.extend(self._reject_batch(
+                    pks[i:i+batch_size], site, send_email, message))
+        return rejected
+
+    @transaction_atomic
+    def _reject_batch(self, pks, site, send_email, message):
+        profiles = []
+        for profile in self.filter(
+                pk__in=pks, _status='untreated').select_related('user'):
+            # a conditional UPDATE for each profile thus profiles which are
+            # rejected (or accepted) concurrently are neither returned nor
+            # emailed twice
+            if self.filter(pk=profile.pk, _status='untreated').update(
+                    _status='rejected', activation_key=None, expires_at=None):
+                profile._status = 'rejected'
+                profile.activation_key = None
+                profile.expires_at = None
+                profiles.append(profile)
+        if send_email:
+            _send_mass_mail(_render_emails(site, 'rejection', [
+                (profile, {'message': message}) for profile in profiles]))
+        return profiles
 
     @transaction_atomic
     def reject_registration(self, profile, site, send_email=True, message=None):
@@ -169,9 +508,12 @@ class RegistrationManager(models.Manager):
 
         """
         # accepted -> rejected is not allowed
-        if profile.status == 'untreated':
-            profile.status = 'rejected'
-            profile.save()
+        updated = self.filter(pk=profile.pk, _status='untreated').update(
+            _status='rejected', activation_key=None, expires_at=None)
+        if updated:
+            profile._status = 'rejected'
+            profile.activation_key = None
+            profile.expires_at = None
 
             if send_email:
                 profile.send_rejection_email(site, message=message)
@@ -179,9 +521,9 @@ class RegistrationManager(models.Manager):
             return profile.user
         return None
 
-    @transaction_atomic
     def activate_user(self, activation_key, site, password=None,
-                      send_email=True, message=None, no_profile_delete=False):
+                      send_email=True, message=None, no_profile_delete=False,
+                      profile=None):
         """activate account with ``activation_key`` and ``password``
 
         Activate account and email notification to the ``User``, returning 
@@ -215,19 +557,59 @@ class RegistrationManager(models.Manager):
         When activation has success, the ``RegistrationProfile`` of the ``User``
         will be deleted from database because the profile is no longer required.
 
+        If the ``RegistrationProfile`` of ``activation_key`` has already been
+        loaded (e.g. by ``ActivationView``), pass it as ``profile`` (with its
+        ``user`` through ``select_related``) to skip looking it up again. The
+        profile is then claimed by activating its inactive ``User`` with a
+        single conditional ``UPDATE`` (``User.save()`` is not called) unless
+        ``no_profile_delete`` is ``True``.
+
         """
-        try:
-            profile = self.get(_status='accepted', activation_key=activation_key)
-        except self.model.DoesNotExist:
+        if not validate_activation_key(activation_key):
+            # malformed, tampered or expired key
             return None
-        if not profile.activation_key_expired():
-            is_generated = password is None
-            password = password or generate_random_password(
-                    length=settings.REGISTRATION_DEFAULT_PASSWORD_LENGTH)
-            user = profile.user
-            user.set_password(password)
-            user.is_active = True
-            user.save()
+        queryset = self.accepted().filter(activation_key=activation_key)
+        if profile is not None:
+            if profile.activation_key != activation_key or \
+                    profile.status != 'accepted':
+                return None
+            queryset = queryset.filter(pk=profile.pk)
+        elif not queryset.exists():
+            # do not waste the password hashing for unknown key
+            return None
+        # hash the password before the transaction because the hashing is
+        # slow and should not keep the transaction open
+        is_generated = password is None
+        password = password or generate_random_password(
+                length=settings.REGISTRATION_DEFAULT_PASSWORD_LENGTH)
+        encoded_password = make_password(password)
+        with transaction_atomic():
+            if profile is not None and not no_profile_delete:
+                # claim the loaded profile by activating its inactive user
+                # with a conditional update. the row is locked until the end
+                # of the transaction thus a concurrent activation with the
+                # same key waits and finds the user active
+                User = get_user_model()
+                if not User.objects.filter(
+                        pk=profile.user_id, is_active=False).update(
+                        password=encoded_password, is_active=True):
+                    return None
+                user = profile.user
+                user.password = encoded_password
+                user.is_active = True
+            else:
+                # claim the profile with a conditional update. the row is
+                # locked until the end of the transaction thus a concurrent
+                # activation with the same key waits and finds the profile
+                # gone
+                if not queryset.update(activation_key=activation_key):
+                    return None
+                if profile is None:
+                    profile = queryset.select_related('user').get()
+                user = profile.user
+                user.password = encoded_password
+                user.is_active = True
+                user.save()
 
             if send_email:
                 profile.send_activation_email(site, password,
@@ -237,17 +619,141 @@ class RegistrationManager(models.Manager):
                 # the profile is no longer required
                 profile.delete()
             return user, password, is_generated
-        return None
+
+    def activate_many(self, queryset, site, send_email=True, message=None,
+                      batch_size=500, processes=None):
+        """activate accepted registrations of profiles in ``queryset`` in bulk
+
+        This is a bulk version of ``activate_user`` for profiles which have
+        been accepted and not expired (others are ignored). Passwords are
+        always generated. Returning a list of ``(user, password,
+        is_generated)``.
+
+        Profiles are activated in batches of ``batch_size``. The passwords of
+        a batch are hashed before the transaction of the batch opens, in the
+        current process or on a process pool when ``processes`` is more than
+        ``1`` (see ``registration.utils.make_passwords``; management commands
+        only). In the transaction, the users are written with
+        ``bulk_update``, the profiles are deleted with a single ``DELETE``
+        and the activation emails are sent together over a single connection
+        with ``registration.utils.send_mass_mail``.
+
+        """
+        pks = list(queryset.filter(_status='accepted').exclude(
+            expires_at__lte=datetime_now()).values_list('pk', flat=True))
+        activated = []
+        # share the email connection among batches
+        with email_connection_pool():
+            for i in range(0, len(pks), batch_size):
+                batch = pks[i:i+batch_size]
+                passwords = [generate_random_password(
+                    length=settings.REGISTRATION_DEFAULT_PASSWORD_LENGTH)
+                    for pk in batch]
+                encoded_passwords = make_passwords(passwords, processes)
+                activated.extend(self._activate_batch(
+                    dict(zip(batch, zip(passwords, encoded_passwords))),
+                    site, send_email, message))
+        return activated
 
     @transaction_atomic
-    def delete_expired_users(self):
+    def _activate_batch(self, passwords, site, send_email, message):
+        User = get_user_model()
+        profiles = list(self.filter(
+            pk__in=passwords.keys(), _status='accepted').exclude(
+            expires_at__lte=datetime_now()).select_related('user'))
+        if not profiles:
+            return []
+        users = []
+        for profile in profiles:
+            user = profile.user
+            user.password = passwords[profile.pk][1]
+            user.is_active = True
+            users.append(user)
+        bulk_update(User.objects, users, ('password', 'is_active'))
+        self.filter(pk__in=[profile.pk for profile in profiles]).delete()
+
+        if send_email:
+            _send_mass_mail(_render_emails(site, 'activation', [(profile, {
+                'password': passwords[profile.pk][0],
+                'is_generated': True,
+                'message': message,
+            }) for profile in profiles]))
+        return [(profile.user, passwords[profile.pk][0], True)
+                for profile in profiles]
+
+    def get_expired_profiles(self):
+        """get profiles whose activation key has expired
+
+        Return a queryset of accepted ``RegistrationProfile`` whose associated
+        ``User`` is still inactive and ``expires_at`` has passed. The
+        expiration is determined in the database with the indexed
+        ``expires_at`` column thus no ``User`` instance is loaded.
+
+        """
+        return self.expired().filter(user__is_active=False)
+
+    def get_rejected_profiles(self):
+        """get rejected profiles whose associated ``User`` is inactive"""
+        return self.rejected().filter(user__is_active=False)
+
+    def delete_users_in_batches(self, queryset, batch_size=None,
+                                start_after=None, dry_run=False):
+        """delete profiles in ``queryset`` and their ``User`` in batches
+
+        Profiles are processed in primary key order and only primary keys are
+        loaded from the database. Each batch of ``batch_size`` profiles
+        (``REGISTRATION_CLEANUP_BATCH_SIZE`` by default) is deleted with their
+        associated ``User`` in its own transaction. In the transaction,
+        ``queryset`` is applied to the batch again and only the ``User`` of
+        the deleted profiles which are still inactive are deleted thus
+        registrations which are changed concurrently (e.g. accepted again by
+        an admin) are kept.
+
+        This is a generator which yields the number of profiles and the
+        primary key of the last profile in each batch once the batch has been
+        committed. The last primary key is a watermark; pass it as
+        ``start_after`` to resume an interrupted cleanup. Nothing is deleted
+        when ``dry_run`` is ``True``.
+
+        """
+        batch_size = batch_size or settings.REGISTRATION_CLEANUP_BATCH_SIZE
+        User = get_user_model()
+        queryset = queryset.order_by('pk')
+        last_pk = start_after
+        while True:
+            batch = queryset
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            rows = list(batch.values_list('pk', 'user')[:batch_size])
+            if not rows:
+                return
+            profile_pks, user_pks = zip(*rows)
+            count = len(rows)
+            if not dry_run:
+                with transaction_atomic():
+                    # the profiles may have been changed (e.g. accepted again)
+                    # since they were listed thus ``queryset`` is applied again
+                    batch = queryset.filter(pk__in=profile_pks)
+                    user_pks = list(batch.values_list('user', flat=True))
+                    batch.delete()
+                    # only users whose profile has been deleted above and
+                    # which are still inactive
+                    User.objects.filter(
+                        pk__in=user_pks, is_active=False,
+                        registration_profile__isnull=True).delete()
+                count = len(user_pks)
+            last_pk = profile_pks[-1]
+            yield count, last_pk
+
+    def delete_expired_users(self, batch_size=None):
         """delete expired users from database
 
         Remove expired instance of ``RegistrationProfile`` and their associated
         ``User``.
 
         Accounts to be deleted are identified by searching for instance of
-        ``RegistrationProfile`` with expired activation keys, and then checking
+        ``RegistrationProfile`` with expired activation keys (see
+        ``get_expired_profiles``), and then checking
         to see if their associated ``User`` instance have the field ``is_active``
         set to ``False`` (it is for compatibility of django-registration); any
         ``User`` who is both inactive and has an expired activation key will be
@@ -278,19 +784,19 @@ class RegistrationManager(models.Manager):
         ``RegistrationProfile``; an inactive ``User`` which does not have an 
         associated ``RegistrationProfile`` will be deleted.
 
+        The expired accounts are determined in the database and deleted in
+        batches of ``batch_size`` (``REGISTRATION_CLEANUP_BATCH_SIZE`` by
+        default, see ``delete_users_in_batches``). Each batch is deleted in
+        its own transaction thus the memory usage and the lock duration do
+        not grow with the number of expired accounts. Returning the number of
+        deleted accounts.
+
         """
-        for profile in self.all():
-            if profile.activation_key_expired():
-                try:
-                    user = profile.user
-                    if not user.is_active:
-                        user.delete()
-                        profile.delete()    # just in case
-                except ObjectDoesNotExist:
-                    profile.delete()
+        batches = self.delete_users_in_batches(self.get_expired_profiles(),
+                                               batch_size=batch_size)
+        return sum(count for count, last_pk in batches)
 
-    @transaction_atomic
-    def delete_rejected_users(self):
+    def delete_rejected_users(self, batch_size=None):
         """delete rejected users from database
 
         Remove rejected instance of ``RegistrationProfile`` and their associated
@@ -328,16 +834,13 @@ class RegistrationManager(models.Manager):
         ``RegistrationProfile``; an inactive ``User`` which does not have an 
         associated ``RegistrationProfile`` will be deleted.
 
+        The rejected accounts are deleted in batches of ``batch_size`` like
+        ``delete_expired_users``. Returning the number of deleted accounts.
+
         """
-        for profile in self.all():
-            if profile.status == 'rejected':
-                try:
-                    user = profile.user
-                    if not user.is_active:
-                        user.delete()
-                        profile.delete() # just in case
-                except ObjectDoesNotExist:
-                    profile.delete()
+        batches = self.delete_users_in_batches(self.get_rejected_profiles(),
+                                               batch_size=batch_size)
+        return sum(count for count, last_pk in batches)
 
 
 class RegistrationProfile(models.Model):
@@ -366,9 +869,13 @@ class RegistrationProfile(models.Model):
                                 editable=False)
     _status = models.CharField(_('status'), max_length=10, db_column='status',
                               choices=STATUS_LIST, default='untreated',
-                              editable=False)
+                              db_index=True, editable=False)
     activation_key = models.CharField(_('activation key'), max_length=40,
-                                      null=True, default=None, editable=False)
+                                      null=True, default=None, unique=True,
+                                      editable=False)
+    expires_at = models.DateTimeField(_('expiration date'), null=True,
+                                      default=None, db_index=True,
+                                      editable=False)
 
     objects = RegistrationManager()
 
@@ -404,23 +911,29 @@ class RegistrationProfile(models.Model):
     def _set_status(self, value):
         """set inspection status of this profile
 
-        Setting status to ``'accepted'`` will generate activation key
-        and update ``date_joined`` attribute to now of associated ``User``
+        Setting status to ``'accepted'`` will generate activation key,
+        update ``date_joined`` attribute to now of associated ``User`` and
+        set ``expires_at`` to ``ACCOUNT_ACTIVATION_DAYS`` days after now.
 
         Setting status not to ``'accepted'`` will remove activation key
-        of this profile.
+        and ``expires_at`` of this profile.
 
         """
         self._status = value
         # Automatically generate activation key for accepted profile
         if value == 'accepted' and not self.activation_key:
-            username = self.user.username
-            self.activation_key = generate_activation_key(username)
             # update user's date_joined
-            self.user.date_joined = datetime_now()
+            now = datetime_now()
+            self.user.date_joined = now
             self.user.save()
+            self.expires_at = now + datetime.timedelta(
+                    days=settings.ACCOUNT_ACTIVATION_DAYS)
+            self.activation_key = _generate_activation_key(
+                    self.pk, self.user.username, self.expires_at)
+            forget_invalid_activation_keys([self.activation_key])
         elif value != 'accepted' and self.activation_key:
             self.activation_key = None
+            self.expires_at = None
     status = property(_get_status, _set_status)
 
     def get_status_display(self):
@@ -449,23 +962,32 @@ class RegistrationProfile(models.Model):
             ``None``. In this case, this method returns ``False`` because these
             profiles are not treated yet or rejected by inspector.
 
-        2.  Otherwise, the date the user signed up (which automatically updated
-            in registration acceptance) is incremented by the number of days 
-            specified in the setting ``ACCOUNT_ACTIVATION_DAYS`` (which should
-            be the number of days after acceptance during which a user is allowed
-            to activate their account); if the result is less than or equal to
-            the current date, the key has expired and this method return ``True``.
+        2.  Otherwise, ``expires_at`` (which is set to the date of registration
+            acceptance incremented by the number of days specified in the
+            setting ``ACCOUNT_ACTIVATION_DAYS``) is compared with the current
+            date; if it is less than or equal to the current date, the key has
+            expired and this method return ``True``.
+
+        The associated ``User`` is not required to determine the expiration
+        thus no extra query is executed.
 
         """
         if self._status != 'accepted':
             return False
-        expiration_date = datetime.timedelta(
-                days=settings.ACCOUNT_ACTIVATION_DAYS)
-        expired = self.user.date_joined + expiration_date <= datetime_now()
-        return expired
+        return self.expires_at is not None and self.expires_at <= datetime_now()
     activation_key_expired.boolean = True
 
-    def _send_email(self, site, action, extra_context=None):
+    def _render_email(self, site, action, extra_context=None):
+        """render the email of ``action`` to the user of this profile
+
+        Returning ``(subject, message, from_email, recipient_list)`` which can
+        be passed to ``registration.utils.send_mail`` or be an item of the
+        ``datatuple`` of ``registration.utils.send_mass_mail``.
+
+        """
+        return _render_emails(site, action, [(self, extra_context)])[0]
+
+    def _get_email_context(self, site, action, extra_context=None):
         context = {
                 'user': self.user,
                 'site': site,
@@ -476,15 +998,15 @@ class RegistrationProfile(models.Model):
 
         if extra_context:
             context.update(extra_context)
+        return context
 
-        subject = render_to_string(
-                'registration/%s_email_subject.txt' % action, context)
-        subject = ''.join(subject.splitlines())
-        message = render_to_string(
-                'registration/%s_email.txt' % action, context)
-
-        send_mail(subject, message,
-                  settings.DEFAULT_FROM_EMAIL, [self.user.email])
+    def _send_email(self, site, action, extra_context=None):
+        email = self._render_email(site, action, extra_context)
+        if settings.REGISTRATION_EMAIL_OUTBOX:
+            # the email is sent by ``registration_send_outbox`` command
+            EmailOutbox.objects.enqueue([email])
+        else:
+            send_mail(*email)
 
     def send_registration_email(self, site):
         """send registration email to the user associated with this profile
@@ -564,12 +1086,15 @@ class RegistrationProfile(models.Model):
             A message from inspector. In default template, it is not shown.
 
         """
-        extra_context = {
+        self._send_email(site, 'acceptance',
+                         self._get_acceptance_email_context(message))
+
+    def _get_acceptance_email_context(self, message=None):
+        return {
                 'activation_key': self.activation_key,
                 'expiration_days': settings.ACCOUNT_ACTIVATION_DAYS,
                 'message': message,
             }
-        self._send_email(site, 'acceptance', extra_context)
 
     def send_rejection_email(self, site, message=None):
         """send rejection email to the user associated with this profile
@@ -657,3 +1182,167 @@ class RegistrationProfile(models.Model):
                 'message': message,
             }
         self._send_email(site, 'activation', extra_context)
+
+
+class EmailOutboxManager(models.Manager):
+    """Manager of ``EmailOutbox``"""
+    def enqueue(self, datatuple, bulk=True):
+        """queue emails in ``datatuple``
+
+        Each item of ``datatuple`` is ``(subject, message, from_email,
+        recipients)`` as ``registration.utils.send_mass_mail``. The emails
+        are written in the current transaction thus they are discarded when
+        the transaction is rolled back. The emails are written with a single
+        ``INSERT`` when ``bulk`` is ``True``, otherwise one by one thus the
+        returned instances have their pks.
+
+        """
+        now = datetime_now()
+        emails = [self.model(
+            subject=subject, message=message, from_email=from_email or '',
+            recipients='\n'.join(recipients), next_attempt_at=now,
+        ) for subject, message, from_email, recipients in datatuple]
+        if bulk:
+            return bulk_create(self, emails)
+        for email in emails:
+            email.save(force_insert=True)
+        return emails
+
+    def due(self):
+        """get pending emails which should be sent now"""
+        return self.filter(status='pending',
+                           next_attempt_at__lte=datetime_now())
+
+    def claim(self, pks, lease=600):
+        """claim due emails of ``pks`` for sending
+
+        Each email is claimed with a conditional ``UPDATE`` which postpones
+        ``next_attempt_at`` by ``lease`` seconds thus concurrent senders
+        (e.g. overlapping ``registration_send_outbox`` commands) never claim
+        the same email. An email whose sender has died is due again after
+        the lease. Returning a list of the claimed pks.
+
+        """
+        now = datetime_now()
+        leased_until = now + datetime.timedelta(seconds=lease)
+        return [pk for pk in pks if self.filter(
+            pk=pk, status='pending', next_attempt_at__lte=now,
+        ).update(next_attempt_at=leased_until)]
+
+    def send_batch(self, batch_size=100, max_attempts=5, backoff=60,
+                   connection=None, lease=600):
+        """send at most ``batch_size`` due emails over a single connection
+
+        See ``send`` for the details. Returning ``(sent, failed, dead)``.
+
+        """
+        pks = list(self.due().order_by('pk').values_list(
+            'pk', flat=True)[:batch_size])
+        return self.send(pks, max_attempts, backoff, connection, lease)
+
+    def send(self, pks, max_attempts=5, backoff=60, connection=None,
+             lease=600):
+        """claim and send due emails of ``pks`` over a single connection
+
+        Only the emails claimed by this call (see ``claim``) are sent. Sent
+        emails are deleted. Failed emails are retried after ``backoff``
+        seconds, doubled on each attempt, and marked as ``'dead'`` when they
+        have failed ``max_attempts`` times.
+
+        Returning ``(sent, failed, dead)``.
+
+        """
+        from django.core.mail import get_connection
+        from django.core.mail import EmailMessage
+        claimed = self.claim(pks, lease)
+        if not claimed:
+            return 0, 0, 0
+        emails = list(self.filter(pk__in=claimed).order_by('pk'))
+        connection = connection or get_connection()
+        error = None
+        try:
+            connection.open()
+        except Exception as e:
+            # all emails in this batch fail
+            error = e
+        sent_pks = []
+        failed = dead = 0
+        try:
+            for email in emails:
+                failure = error
+                if failure is None:
+                    try:
+                        EmailMessage(email.subject, email.message,
+                                     email.from_email or None,
+                                     email.recipient_list,
+                                     connection=connection).send()
+                    except Exception as e:
+                        failure = e
+                if failure is None:
+                    sent_pks.append(email.pk)
+                elif email.retry_or_bury(failure, max_attempts, backoff):
+                    failed += 1
+                else:
+                    dead += 1
+        finally:
+            connection.close()
+        self.filter(pk__in=sent_pks).delete()
+        return len(sent_pks), failed, dead
+
+
+class EmailOutbox(models.Model):
+    """An email waiting to be sent by ``registration_send_outbox`` command
+
+    Emails of ``RegistrationProfile`` are written to this model instead of
+    being sent when ``REGISTRATION_EMAIL_OUTBOX`` is ``True``. The emails
+    which have failed too many times are kept as ``'dead'``.
+
+    """
+    STATUS_LIST = (
+        ('pending', _('Pending')),
+        ('dead', _('Dead')),
+    )
+    subject = models.TextField(_('subject'))
+    message = models.TextField(_('message'))
+    from_email = models.CharField(_('from email'), max_length=255,
+                                  blank=True)
+    recipients = models.TextField(_('recipients'))
+    status = models.CharField(_('status'), max_length=10,
+                              choices=STATUS_LIST, default='pending',
+                              db_index=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    next_attempt_at = models.DateTimeField(_('next attempt date'),
+                                           db_index=True)
+    last_error = models.TextField(_('last error'), blank=True)
+    created_at = models.DateTimeField(_('created date'), auto_now_add=True)
+
+    objects = EmailOutboxManager()
+
+    class Meta:
+        verbose_name = _('outbox email')
+        verbose_name_plural = _('outbox emails')
+
+    def __unicode__(self):
+        return self.subject
+
+    @property
+    def recipient_list(self):
+        """a list of recipients"""
+        return self.recipients.splitlines()
+
+    def retry_or_bury(self, error, max_attempts=5, backoff=60):
+        """record the failure of sending this email
+
+        Returning ``True`` if this email will be retried, ``False`` if this
+        email has become ``'dead'``.
+
+        """
+        self.attempts += 1
+        self.last_error = force_unicode(error) or repr(error)
+        if self.attempts >= max_attempts:
+            self.status = 'dead'
+        else:
+            self.next_attempt_at = datetime_now() + datetime.timedelta(
+                seconds=backoff * 2 ** (self.attempts - 1))
+        self.save()
+        return self.status == 'pending'
@@ -7,6 +7,7 @@ __all__ = ('RegistrationSupplementBase', 'get_supplement_class')
 from django.core.exceptions import ImproperlyConfigured
 
 from registration.compat import import_module
+from registration.utils import get_from_registry
 from registration.supplements.base import RegistrationSupplementBase
 
 
@@ -19,12 +20,20 @@ def get_supplement_class(path=None):
     exists, or because the module does not contain a class of the
     appropriate name), ``django.core.exceptions.ImproperlyConfigured``
     is raised.
+
+    The class is resolved once per process (see
+    ``registration.utils.get_from_registry``).
    
     """
     from registration.conf import settings
     path = path or settings.REGISTRATION_SUPPLEMENT_CLASS
     if not path:
         return None
+    return get_from_registry(('supplement_class', path),
+                             lambda: _get_supplement_class(path))
+
+
+def _get_supplement_class(path):
     i = path.rfind('.')
     module, attr = path[:i], path[i+1:]
     try:
@@ -6,3 +6,28 @@ try:
     from django.test.utils import override_settings
 except ImportError:
     from override_settings import override_settings
+
+try:
+    from django.test.utils import CaptureQueriesContext
+except ImportError:
+    # Django 1.5 and earlier
+    class CaptureQueriesContext(object):
+        """capture the queries executed on ``connection`` in ``with`` block"""
+        def __init__(self, connection):
+            self.connection = connection
+
+        def __enter__(self):
+            self.use_debug_cursor = self.connection.use_debug_cursor
+            self.connection.use_debug_cursor = True
+            self.initial_queries = len(self.connection.queries)
+            self.final_queries = None
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            self.connection.use_debug_cursor = self.use_debug_cursor
+            self.final_queries = len(self.connection.queries)
+
+        @property
+        def captured_queries(self):
+            return self.connection.queries[
+                self.initial_queries:self.final_queries]
@@ -40,8 +40,13 @@ Original License::
     OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+from smtplib import SMTPServerDisconnected
+from contextlib import contextmanager
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.test.client import RequestFactory
+from registration import utils
 from registration.utils import get_site
 
 
@@ -70,3 +75,118 @@ def mock_site():
     """
     return get_site(mock_request())
 
+
+class FailingEmailBackend(BaseEmailBackend):
+    """
+    An email backend which behaves like an unreachable SMTP server; this is
+    used in testing the retry of email sending
+
+    """
+    def open(self):
+        raise SMTPServerDisconnected('Connection unexpectedly closed')
+
+    def send_messages(self, email_messages):
+        raise SMTPServerDisconnected('Connection unexpectedly closed')
+
+
+class CountingEmailBackend(EmailBackend):
+    """
+    A locmem email backend which counts opened connections like an SMTP
+    server; this is used in testing the reuse of email connections
+
+    """
+    opened = 0
+
+    def __init__(self, *args, **kwargs):
+        super(CountingEmailBackend, self).__init__(*args, **kwargs)
+        self.connection = None
+
+    def open(self):
+        if self.connection:
+            return False
+        CountingEmailBackend.opened += 1
+        self.connection = True
+        return True
+
+    def close(self):
+        self.connection = None
+
+    def send_messages(self, messages):
+        new_conn_created = self.open()
+        try:
+            return super(CountingEmailBackend, self).send_messages(messages)
+        finally:
+            if new_conn_created:
+                self.close()
+
+
+class RecordingEmailDispatcher(object):
+    """
+    A ``BackgroundEmailDispatcher`` which records the submitted
+    ``EmailOutbox`` pks instead of sending them on background threads; the
+    in-memory test database is not shared with other threads
+
+    """
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, pks):
+        self.submitted.append(pks)
+
+    def join(self):
+        pass
+
+
+@contextmanager
+def mock_background_email_dispatcher():
+    """
+    Replace the process-wide ``BackgroundEmailDispatcher`` with a
+    ``RecordingEmailDispatcher`` in ``with`` block
+
+    """
+    original = utils._background_email_dispatcher
+    dispatcher = utils._background_email_dispatcher = \
+        RecordingEmailDispatcher()
+    try:
+        yield dispatcher
+    finally:
+        utils._background_email_dispatcher = original
+
+
+class RecordingPool(object):
+    """
+    A ``multiprocessing.Pool`` which records the number of processes and
+    maps in the current process; forked workers would not see the
+    in-memory test database
+
+    """
+    created = []
+
+    def __init__(self, processes=None):
+        RecordingPool.created.append(processes)
+
+    def map(self, func, iterable):
+        return [func(x) for x in iterable]
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+@contextmanager
+def mock_process_pool():
+    """
+    Replace ``multiprocessing.Pool`` used by ``registration.utils`` with a
+    ``RecordingPool`` in ``with`` block and yield the list of the number of
+    processes of each created pool
+
+    """
+    original = utils.multiprocessing.Pool
+    utils.multiprocessing.Pool = RecordingPool
+    RecordingPool.created = []
+    try:
+        yield RecordingPool.created
+    finally:
+        utils.multiprocessing.Pool = original
@@ -42,6 +42,27 @@ class RegistrationAdminTestCase(TestCase):
         self.assertTemplateUsed(response,
                                 'admin/change_list.html')
 
+    def test_change_list_view_status_filter(self):
+        untreated_user = self.backend.register(
+            username='bob', email='bob@example.com',
+            request=self.mock_request)
+        accepted_user = self.backend.register(
+            username='alice', email='alice@example.com',
+            request=self.mock_request)
+        self.backend.accept(accepted_user.registration_profile,
+                            request=self.mock_request)
+
+        url = self.admin_url + "registration/registrationprofile/"
+        response = self.client.get(url, {'status': 'untreated'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context['cl'].result_list),
+            [untreated_user.registration_profile])
+
+        response = self.client.get(url, {'status': 'expired'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
     def test_change_view_get(self):
         self.backend.register(
             username='bob', email='bob@example.com',
@@ -2,6 +2,7 @@
 """
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+import gc
 import datetime
 from django.test import TestCase
 from django.conf import settings
@@ -33,6 +34,18 @@ class RegistrationBackendRetrievalTests(TestCase):
         self.assertRaises(ImproperlyConfigured, get_backend,
                 'registration.backends.default.NonexistenBackend')
 
+    def test_get_backend_cached(self):
+        path = 'registration.backends.default.DefaultRegistrationBackend'
+        backend = get_backend(path)
+        self.failUnless(get_backend(path) is backend)
+
+    def test_get_backend_cache_invalidation(self):
+        path = 'registration.backends.default.DefaultRegistrationBackend'
+        backend = get_backend(path)
+        with override_settings(REGISTRATION_BACKEND_CLASS=path):
+            # the registry is cleared when the setting has changed
+            self.failIf(get_backend() is backend)
+
 @override_settings(
         ACCOUNT_ACTIVATION_DAYS=7,
         REGISTRATION_OPEN=True,
@@ -167,8 +180,8 @@ class DefaultRegistrationBackendTestCase(TestCase):
         profile = expired_user.registration_profile
         self.backend.accept(profile, request=self.mock_request)
 
-        expired_user.date_joined -= datetime.timedelta(days=settings.ACCOUNT_ACTIVATION_DAYS+1)
-        expired_user.save()
+        profile.expires_at -= datetime.timedelta(days=settings.ACCOUNT_ACTIVATION_DAYS+1)
+        profile.save()
 
         activated_user = self.backend.activate(
                 activation_key=profile.activation_key,
@@ -261,6 +274,64 @@ class DefaultRegistrationBackendTestCase(TestCase):
 
         self.assertEqual(len(received_signals), 0)
 
+    def test_acceptance_signal_many(self):
+        def receiver(sender, user, profile, **kwargs):
+            self.assertEqual(user.registration_profile, profile)
+            received_signals.append(user.username)
+
+        received_signals = []
+        signals.user_accepted.connect(receiver, sender=self.backend.__class__)
+
+        self.backend.register(username='bob', email='bob@example.com', request=self.mock_request)
+        self.backend.register(username='alice', email='alice@example.com', request=self.mock_request)
+        users = self.backend.accept_many(RegistrationProfile.objects.all(),
+                                         request=self.mock_request)
+
+        self.assertEqual(sorted(user.username for user in users),
+                         ['alice', 'bob'])
+        self.assertEqual(sorted(received_signals), ['alice', 'bob'])
+
+    def test_rejection_signal_many(self):
+        def receiver(sender, user, profile, **kwargs):
+            self.assertEqual(user.registration_profile, profile)
+            received_signals.append(user.username)
+
+        received_signals = []
+        signals.user_rejected.connect(receiver, sender=self.backend.__class__)
+
+        self.backend.register(username='bob', email='bob@example.com', request=self.mock_request)
+        self.backend.register(username='alice', email='alice@example.com', request=self.mock_request)
+        users = self.backend.reject_many(RegistrationProfile.objects.all(),
+                                         request=self.mock_request)
+
+        self.assertEqual(sorted(user.username for user in users),
+                         ['alice', 'bob'])
+        self.assertEqual(sorted(received_signals), ['alice', 'bob'])
+
+    def test_force_activation_signal_many(self):
+        def receiver(sender, user, password, is_generated, **kwargs):
+            self.failUnless(is_generated)
+            self.failUnless(user.check_password(password))
+            received_signals.append(user.username)
+
+        # receivers connected (but not disconnected) in other tests are
+        # weakly referenced and alive until they are garbage collected; they
+        # would see the generated passwords of this test
+        gc.collect()
+        received_signals = []
+        signals.user_activated.connect(receiver, sender=self.backend.__class__)
+
+        self.backend.register(username='bob', email='bob@example.com', request=self.mock_request)
+        self.backend.register(username='alice', email='alice@example.com', request=self.mock_request)
+        users = self.backend.force_activate_many(
+            RegistrationProfile.objects.untreated(),
+            request=self.mock_request, send_email=False)
+
+        self.assertEqual(sorted(user.username for user in users),
+                         ['alice', 'bob'])
+        self.assertEqual(sorted(received_signals), ['alice', 'bob'])
+        self.assertEqual(RegistrationProfile.objects.count(), 0)
+
     def test_rejection_signal(self):
         def receiver(sender, user, profile, **kwargs):
             self.assertEqual(user.username, 'bob')
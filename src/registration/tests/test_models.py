@@ -2,16 +2,37 @@
 """
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+import os
 import datetime
+import tempfile
+from StringIO import StringIO
 from django.test import TestCase
 from django.conf import settings
 from django.core import mail
 from django.core import management
+from django.db import connection
+from django.utils.http import int_to_base36
+from django.utils.http import base36_to_int
 
 from registration.compat import get_user_model
 from registration.models import RegistrationProfile
+from registration.models import EmailOutbox
+from registration.compat import transaction_atomic
+from registration.compat import datetime_now
+from registration.utils import SHA1_RE
 from registration.utils import generate_activation_key
+from registration.utils import generate_signed_activation_key
+from registration.utils import validate_activation_key
+from registration.utils import get_compiled_template
+from registration.utils import render_many
+from registration.utils import email_connection_pool
+from registration.utils import dispatch_mass_mail
+from registration.utils import background_email_dispatch
+from registration.utils import EmailDispatchError
 from registration.tests.mock import mock_site
+from registration.tests.mock import mock_background_email_dispatcher
+from registration.tests.mock import mock_process_pool
+from registration.tests.mock import CountingEmailBackend
 from registration.tests.compat import override_settings
 
 
@@ -78,14 +99,17 @@ class RegistrationProfileTestCase(TestCase):
             settings.ACCOUNT_ACTIVATION_DAYS+1
         )
         profile.status = 'untreated'
+        self.assertEqual(profile.expires_at, None)
         self.assertEqual(profile.status, 'untreated')
         self.assertEqual(profile.activation_key_expired(), False)
         profile.status = 'rejected'
         self.assertEqual(profile.status, 'rejected')
         self.assertEqual(profile.activation_key_expired(), False)
         profile.status = 'accepted'
-        # status = accepted change date_joined
-        new_user.date_joined -= datetime.timedelta(
+        # status = accepted change date_joined and expires_at
+        self.assertEqual(profile.expires_at, new_user.date_joined +
+                         datetime.timedelta(settings.ACCOUNT_ACTIVATION_DAYS))
+        profile.expires_at -= datetime.timedelta(
             settings.ACCOUNT_ACTIVATION_DAYS+1
         )
         self.assertEqual(profile.status, 'expired')
@@ -146,6 +170,17 @@ class RegistrationProfileManagerTestCase(TestCase):
         self.failIf(new_user.is_active)
         self.failIf(new_user.has_usable_password())
 
+    def test_register_single_insert(self):
+        User = get_user_model()
+        new_user = RegistrationProfile.objects.register(
+            username='bob', email='bob@EXAMPLE.com',
+            site=self.mock_site, send_email=False)
+        new_user = User.objects.get(pk=new_user.pk)
+        self.assertEqual(new_user.email, 'bob@example.com')
+        self.failIf(new_user.is_active)
+        self.failIf(new_user.has_usable_password())
+        self.failUnless(new_user.date_joined)
+
     def test_register_email(self):
         RegistrationProfile.objects.register(site=self.mock_site,
                                              **self.user_info)
@@ -159,6 +194,48 @@ class RegistrationProfileManagerTestCase(TestCase):
 
         self.assertEqual(len(mail.outbox), 0)
 
+    def test_bulk_register(self):
+        RegistrationProfile.objects.register(site=self.mock_site,
+                                             send_email=False,
+                                             **self.user_info)
+        users = iter([
+            ('alice', 'alice@example.com'),
+            ('bob', 'bob@example.com'),
+            ('carol', 'carol@example.com'),
+            ('bob', 'bob2@example.com'),
+            ('dave', 'dave@example.com'),
+        ])
+        registered = RegistrationProfile.objects.bulk_register(
+            users, site=self.mock_site, batch_size=2)
+        # alice has already registered and bob is duplicated
+        self.assertEqual(registered, 3)
+        self.assertEqual(RegistrationProfile.objects.untreated().count(), 4)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [
+            'bob@example.com', 'carol@example.com', 'dave@example.com',
+        ])
+        User = get_user_model()
+        for user in User.objects.filter(username__in=['bob', 'carol', 'dave']):
+            self.failIf(user.is_active)
+            self.failIf(user.has_usable_password())
+            self.assertEqual(user.registration_profile.status, 'untreated')
+
+    def test_management_command_import_registrations(self):
+        fd, filename = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(fd, 'wb') as fo:
+                fo.write(b'username,email\n'
+                         b'bob,bob@example.com\n'
+                         b'carol,carol@example.com\n'
+                         b'jos\xc3\xa9,jose@example.com\n')
+            management.call_command('import_registrations', filename,
+                                    stdout=StringIO())
+        finally:
+            os.remove(filename)
+        self.assertEqual(RegistrationProfile.objects.count(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        User = get_user_model()
+        self.failUnless(User.objects.filter(username=u'jos\xe9').exists())
+
     def test_acceptance(self):
         new_user = RegistrationProfile.objects.register(site=self.mock_site,
                                                         send_email=False,
@@ -227,6 +304,332 @@ class RegistrationProfileManagerTestCase(TestCase):
         self.assertEqual(profile.status, 'accepted')
         self.assertNotEqual(profile.activation_key, None)
 
+    def test_acceptance_and_rejection_with_stale_instance(self):
+        new_user = RegistrationProfile.objects.register(site=self.mock_site,
+                                                        send_email=False,
+                                                        **self.user_info)
+        profile = new_user.registration_profile
+        # another inspector loaded the same profile
+        stale_profile = RegistrationProfile.objects.get(pk=profile.pk)
+
+        result = RegistrationProfile.objects.accept_registration(
+            profile, site=self.mock_site, send_email=False)
+        self.failUnless(result)
+        self.assertEqual(profile.status, 'accepted')
+
+        # the stale instance still thinks the profile is untreated but the
+        # transitions are decided by database
+        self.assertEqual(stale_profile.status, 'untreated')
+        result = RegistrationProfile.objects.reject_registration(
+            stale_profile, site=self.mock_site, send_email=False)
+        self.failIf(result)
+        result = RegistrationProfile.objects.accept_registration(
+            stale_profile, site=self.mock_site, send_email=False)
+        self.failIf(result)
+
+        profile = RegistrationProfile.objects.get(pk=profile.pk)
+        self.assertEqual(profile.status, 'accepted')
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_activation_loaded_profile_twice_fail(self):
+        new_user = RegistrationProfile.objects.register(site=self.mock_site,
+                                                        send_email=False,
+                                                        **self.user_info)
+        profile = new_user.registration_profile
+        RegistrationProfile.objects.accept_registration(
+            profile, site=self.mock_site, send_email=False)
+        # two requests have loaded the same profile
+        profiles = [RegistrationProfile.objects.select_related('user').get(
+            pk=profile.pk) for i in range(2)]
+
+        result = RegistrationProfile.objects.activate_user(
+            activation_key=profile.activation_key,
+            site=self.mock_site,
+            password='swordfish',
+            send_email=False,
+            profile=profiles[0],
+        )
+        self.failUnless(result)
+        result = RegistrationProfile.objects.activate_user(
+            activation_key=profile.activation_key,
+            site=self.mock_site,
+            password='password',
+            send_email=False,
+            profile=profiles[1],
+        )
+        self.failIf(result)
+        User = get_user_model()
+        user = User.objects.get(pk=new_user.pk)
+        self.failUnless(user.is_active)
+        self.failUnless(user.check_password('swordfish'))
+
+    def test_activation_twice_fail(self):
+        new_user = RegistrationProfile.objects.register(site=self.mock_site,
+                                                        send_email=False,
+                                                        **self.user_info)
+        profile = new_user.registration_profile
+        RegistrationProfile.objects.accept_registration(
+            profile, site=self.mock_site, send_email=False)
+
+        result = RegistrationProfile.objects.activate_user(
+            activation_key=profile.activation_key,
+            site=self.mock_site,
+            password='swordfish',
+            send_email=False,
+        )
+        self.failUnless(result)
+        result = RegistrationProfile.objects.activate_user(
+            activation_key=profile.activation_key,
+            site=self.mock_site,
+            password='password',
+            send_email=False,
+        )
+        self.failIf(result)
+        User = get_user_model()
+        self.failUnless(User.objects.get(pk=new_user.pk).check_password(
+            'swordfish'))
+
+    def test_activate_many(self):
+        untreated, accepted, expired = self._register_users(
+            'untreated', 'accepted', 'expired')
+        for profile in (accepted, expired):
+            RegistrationProfile.objects.accept_registration(
+                profile, site=self.mock_site, send_email=False)
+        expired.expires_at = datetime_now()
+        expired.save()
+
+        with mock_process_pool() as pools:
+            activated = RegistrationProfile.objects.activate_many(
+                RegistrationProfile.objects.all(), site=self.mock_site,
+                send_email=False, processes=2)
+        # a single password is hashed in the current process
+        self.assertEqual(pools, [])
+        self.assertEqual(len(activated), 1)
+        user, password, is_generated = activated[0]
+        self.failUnless(is_generated)
+        User = get_user_model()
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual(user.username, 'accepted')
+        self.failUnless(user.is_active)
+        self.failUnless(user.check_password(password))
+        self.failIf(RegistrationProfile.objects.filter(
+            pk=accepted.pk).exists())
+        self.assertEqual(RegistrationProfile.objects.count(), 2)
+
+    @override_settings(REGISTRATION_PASSWORD_HASHING_PROCESSES=3)
+    def test_management_command_force_activate_registrations_setting(self):
+        self._register_users('alice', 'bob', 'carol')
+        with mock_process_pool() as pools:
+            management.call_command('force_activate_registrations',
+                                    status='untreated', send_email=False,
+                                    stdout=StringIO())
+        self.assertEqual(pools, [3])
+        self.assertEqual(RegistrationProfile.objects.count(), 0)
+
+    def test_activate_many_processes(self):
+        profiles = self._register_users('alice', 'bob', 'carol')
+        for profile in profiles:
+            RegistrationProfile.objects.accept_registration(
+                profile, site=self.mock_site, send_email=False)
+        with mock_process_pool() as pools:
+            activated = RegistrationProfile.objects.activate_many(
+                RegistrationProfile.objects.all(), site=self.mock_site,
+                send_email=False, processes=2)
+        self.assertEqual(pools, [2])
+        self.assertEqual(len(activated), 3)
+        for user, password, is_generated in activated:
+            self.failUnless(user.check_password(password))
+
+    def test_activate_many_in_process(self):
+        profiles = self._register_users('alice', 'bob')
+        for profile in profiles:
+            RegistrationProfile.objects.accept_registration(
+                profile, site=self.mock_site, send_email=False)
+        with mock_process_pool() as pools:
+            activated = RegistrationProfile.objects.activate_many(
+                RegistrationProfile.objects.all(), site=self.mock_site,
+                send_email=False)
+        # no pool is used unless ``processes`` is given
+        self.assertEqual(pools, [])
+        self.assertEqual(len(activated), 2)
+
+    def test_management_command_force_activate_registrations(self):
+        self._register_users('alice', 'bob', 'carol')
+        with mock_process_pool() as pools:
+            management.call_command('force_activate_registrations',
+                                    'alice', 'bob', send_email=False,
+                                    processes=2, stdout=StringIO())
+        self.assertEqual(pools, [2])
+        User = get_user_model()
+        self.assertEqual(sorted(User.objects.filter(
+            is_active=True).values_list('username', flat=True)),
+            ['alice', 'bob'])
+        self.assertEqual(RegistrationProfile.objects.untreated().count(), 1)
+
+    @override_settings(
+        EMAIL_BACKEND='registration.tests.mock.CountingEmailBackend')
+    def test_email_connection_pool(self):
+        CountingEmailBackend.opened = 0
+        profiles = self._register_users('alice', 'bob', 'carol')
+        self.assertEqual(CountingEmailBackend.opened, 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+        with email_connection_pool():
+            for profile in profiles:
+                profile.send_registration_email(self.mock_site)
+            RegistrationProfile.objects.accept_many(
+                RegistrationProfile.objects.all(), site=self.mock_site,
+                batch_size=1)
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+
+        # without pool, each call opens a connection
+        for profile in profiles:
+            profile.send_registration_email(self.mock_site)
+        self.assertEqual(CountingEmailBackend.opened, 4)
+
+    @override_settings(REGISTRATION_EMAIL_CONCURRENCY=4,
+                       REGISTRATION_EMAIL_QUEUE_SIZE=2)
+    def test_concurrent_email_dispatch(self):
+        self._register_users('alice', 'bob', 'carol', 'dave', 'eve')
+        RegistrationProfile.objects.accept_many(
+            RegistrationProfile.objects.all(), site=self.mock_site)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [
+            'alice@example.com', 'bob@example.com', 'carol@example.com',
+            'dave@example.com', 'eve@example.com',
+        ])
+
+    @override_settings(
+        REGISTRATION_EMAIL_CONCURRENCY=2,
+        EMAIL_BACKEND='registration.tests.mock.FailingEmailBackend')
+    def test_concurrent_email_dispatch_failures(self):
+        datatuple = [('subject', 'message', None, ['%s@example.com' % name])
+                     for name in ('alice', 'bob', 'carol')]
+        try:
+            dispatch_mass_mail(datatuple)
+        except EmailDispatchError as e:
+            self.assertEqual(sorted(item for item, error in e.failures),
+                             sorted(datatuple))
+        else:
+            self.fail('EmailDispatchError was not raised')
+
+    def test_background_email_dispatch(self):
+        profiles = self._register_users('alice', 'bob')
+        with mock_background_email_dispatcher() as dispatcher:
+            with background_email_dispatch():
+                for profile in profiles:
+                    profile.send_registration_email(self.mock_site)
+                # the emails are written to the outbox
+                self.assertEqual(len(mail.outbox), 0)
+                self.assertEqual(dispatcher.submitted, [])
+        pks = list(EmailOutbox.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        self.assertEqual(len(pks), 2)
+        # the emails are passed to the dispatcher after the block
+        self.assertEqual(dispatcher.submitted, [pks])
+
+        # the dispatcher sends them with ``EmailOutbox.objects.send``
+        self.assertEqual(EmailOutbox.objects.send(pks), (2, 0, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [
+            'alice@example.com', 'bob@example.com',
+        ])
+
+    def test_background_email_dispatch_rolled_back(self):
+        with mock_background_email_dispatcher() as dispatcher:
+            try:
+                with background_email_dispatch():
+                    with transaction_atomic():
+                        RegistrationProfile.objects.register(
+                            username='alice', email='alice@example.com',
+                            site=self.mock_site)
+                        raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(EmailOutbox.objects.count(), 0)
+        self.assertEqual(dispatcher.submitted, [])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def _register_users(self, *usernames):
+        return [RegistrationProfile.objects.register(
+            username=username, email='%s@example.com' % username,
+            site=self.mock_site, send_email=False,
+        ).registration_profile for username in usernames]
+
+    def test_accept_many(self):
+        untreated, rejected, accepted = self._register_users(
+            'untreated', 'rejected', 'accepted')
+        RegistrationProfile.objects.reject_registration(
+            rejected, site=self.mock_site, send_email=False)
+        RegistrationProfile.objects.accept_registration(
+            accepted, site=self.mock_site, send_email=False)
+
+        profiles = RegistrationProfile.objects.accept_many(
+            RegistrationProfile.objects.all(), site=self.mock_site,
+            batch_size=1)
+
+        self.assertEqual(sorted(p.pk for p in profiles),
+                         sorted([untreated.pk, rejected.pk]))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [
+            'rejected@example.com', 'untreated@example.com',
+        ])
+        for profile in profiles:
+            self.assertEqual(profile.status, 'accepted')
+            self.failUnless(profile.activation_key)
+            self.assertEqual(profile.expires_at, profile.user.date_joined +
+                             datetime.timedelta(
+                                 days=settings.ACCOUNT_ACTIVATION_DAYS))
+            self.failUnless(profile.activation_key in mail.outbox[0].body or
+                            profile.activation_key in mail.outbox[1].body)
+        # accepted profile is not modified without force
+        self.assertEqual(
+            RegistrationProfile.objects.get(pk=accepted.pk).activation_key,
+            accepted.activation_key)
+
+    def test_accept_many_force(self):
+        accepted, = self._register_users('accepted')
+        RegistrationProfile.objects.accept_registration(
+            accepted, site=self.mock_site, send_email=False)
+
+        profiles = RegistrationProfile.objects.accept_many(
+            RegistrationProfile.objects.all(), site=self.mock_site,
+            send_email=False, force=True)
+
+        self.assertEqual(len(profiles), 1)
+        self.assertNotEqual(profiles[0].activation_key,
+                            accepted.activation_key)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_reject_many(self):
+        untreated, accepted = self._register_users('untreated', 'accepted')
+        RegistrationProfile.objects.accept_registration(
+            accepted, site=self.mock_site, send_email=False)
+
+        profiles = RegistrationProfile.objects.reject_many(
+            RegistrationProfile.objects.all(), site=self.mock_site)
+
+        self.assertEqual([p.pk for p in profiles], [untreated.pk])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['untreated@example.com'])
+        # accepted -> rejected is not allowed
+        self.assertEqual(RegistrationProfile.objects.rejected().count(), 1)
+        self.assertEqual(RegistrationProfile.objects.accepted().count(), 1)
+
+    def test_reject_many_concurrently_rejected(self):
+        alice, bob = self._register_users('alice', 'bob')
+        pks = [alice.pk, bob.pk]
+        # bob is rejected after reject_many has collected the pks
+        RegistrationProfile.objects.reject_registration(
+            bob, site=self.mock_site)
+        mail.outbox = []
+
+        profiles = RegistrationProfile.objects._reject_batch(
+            pks, site=self.mock_site, send_email=True, message=None)
+
+        self.assertEqual([p.pk for p in profiles], [alice.pk])
+        self.assertEqual(profiles[0].status, 'rejected')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+
     def test_rejection(self):
         new_user = RegistrationProfile.objects.register(site=self.mock_site,
                                                         send_email=False,
@@ -505,10 +908,10 @@ class RegistrationProfileManagerTestCase(TestCase):
             profile, site=self.mock_site
         )
 
-        new_user.date_joined -= datetime.timedelta(
+        profile.expires_at -= datetime.timedelta(
             days=settings.ACCOUNT_ACTIVATION_DAYS + 1
         )
-        new_user.save()
+        profile.save()
 
         result = RegistrationProfile.objects.activate_user(
             activation_key=profile.activation_key,
@@ -526,6 +929,67 @@ class RegistrationProfileManagerTestCase(TestCase):
             RegistrationProfile.objects.filter(pk=profile.pk).exists()
         )
 
+    @override_settings(REGISTRATION_SIGNED_ACTIVATION_KEY=True)
+    def test_activation_with_signed_key(self):
+        new_user = RegistrationProfile.objects.register(site=self.mock_site,
+                                                        send_email=False,
+                                                        **self.user_info)
+
+        profile = new_user.registration_profile
+        RegistrationProfile.objects.accept_registration(
+            profile, site=self.mock_site, send_email=False
+        )
+        self.failIf(SHA1_RE.match(profile.activation_key))
+        self.failUnless(len(profile.activation_key) <= 40)
+
+        # tampered key is rejected without touching database
+        pk36, expires36, nonce, signature = profile.activation_key.split('_')
+        tampered_key = '_'.join((pk36, int_to_base36(
+            base36_to_int(expires36) + 86400), nonce, signature))
+        with self.assertNumQueries(0):
+            result = RegistrationProfile.objects.activate_user(
+                activation_key=tampered_key,
+                site=self.mock_site,
+                password='swordfish'
+            )
+        self.failIf(result)
+
+        result = RegistrationProfile.objects.activate_user(
+            activation_key=profile.activation_key,
+            site=self.mock_site,
+            password='swordfish',
+            send_email=False,
+        )
+        self.failUnless(result)
+        self.failUnless(result[0].check_password('swordfish'))
+
+    @override_settings(REGISTRATION_SIGNED_ACTIVATION_KEY=True)
+    def test_accept_many_with_signed_key(self):
+        self._register_users('alice', 'bob')
+        profiles = RegistrationProfile.objects.accept_many(
+            RegistrationProfile.objects.all(),
+            site=self.mock_site, send_email=False)
+        for profile in profiles:
+            self.failUnless(validate_activation_key(profile.activation_key))
+            self.failUnless(profile.activation_key.startswith(
+                int_to_base36(profile.pk) + '_'))
+
+    def test_validate_activation_key(self):
+        expires_at = datetime_now() + datetime.timedelta(days=1)
+        self.failUnless(validate_activation_key(
+            generate_activation_key('alice')))
+        self.failUnless(validate_activation_key(
+            generate_signed_activation_key(1, expires_at)))
+        self.failIf(validate_activation_key(None))
+        self.failIf(validate_activation_key('invalidactivationkey'))
+        self.failIf(validate_activation_key(
+            generate_signed_activation_key(1, datetime_now() -
+                                           datetime.timedelta(seconds=1))))
+        # the signature is bound to SECRET_KEY
+        key = generate_signed_activation_key(1, expires_at)
+        with override_settings(SECRET_KEY='another secret key'):
+            self.failIf(validate_activation_key(key))
+
     def test_activation_with_invalid_key_fail(self):
         new_user = RegistrationProfile.objects.register(site=self.mock_site,
                                                         send_email=False,
@@ -607,6 +1071,9 @@ class RegistrationProfileManagerTestCase(TestCase):
         expired_untreated_user.save()
         expired_accepted_user.date_joined -= delta
         expired_accepted_user.save()
+        expired_accepted_profile = expired_accepted_user.registration_profile
+        expired_accepted_profile.expires_at -= delta
+        expired_accepted_profile.save()
         expired_rejected_user.date_joined -= delta
         expired_rejected_user.save()
 
@@ -618,6 +1085,70 @@ class RegistrationProfileManagerTestCase(TestCase):
                           User.objects.get,
                           username='expired_accepted_user')
 
+    def test_expired_user_deletion_in_batches(self):
+        untreated_user = RegistrationProfile.objects.register(
+            username='untreated_user',
+            email='untreated_user@example.com',
+            site=self.mock_site, send_email=False,
+        )
+        delta = datetime.timedelta(days=settings.ACCOUNT_ACTIVATION_DAYS+1)
+        for i in range(5):
+            user = RegistrationProfile.objects.register(
+                username='expired_accepted_user%d' % i,
+                email='expired_accepted_user%d@example.com' % i,
+                site=self.mock_site, send_email=False,
+            )
+            RegistrationProfile.objects.accept_registration(
+                user.registration_profile,
+                site=self.mock_site, send_email=False,
+            )
+            user.registration_profile.expires_at -= delta
+            user.registration_profile.save()
+        untreated_user.date_joined -= delta
+        untreated_user.save()
+
+        deleted = RegistrationProfile.objects.delete_expired_users(
+            batch_size=2)
+        self.assertEqual(deleted, 5)
+        User = get_user_model()
+        self.assertEqual(RegistrationProfile.objects.count(), 1)
+        self.assertEqual(list(User.objects.values_list('username', flat=True)),
+                         ['untreated_user'])
+
+    def test_queryset_effective_status(self):
+        for username in ('untreated', 'accepted', 'expired', 'rejected'):
+            RegistrationProfile.objects.register(
+                username=username, email='%s@example.com' % username,
+                site=self.mock_site, send_email=False,
+            )
+        profiles = dict((p.user.username, p) for p in
+                        RegistrationProfile.objects.select_related('user'))
+        for username in ('accepted', 'expired'):
+            RegistrationProfile.objects.accept_registration(
+                profiles[username], site=self.mock_site, send_email=False,
+            )
+        RegistrationProfile.objects.reject_registration(
+            profiles['rejected'], site=self.mock_site, send_email=False,
+        )
+        profiles['expired'].expires_at -= datetime.timedelta(
+            days=settings.ACCOUNT_ACTIVATION_DAYS+1)
+        profiles['expired'].save()
+
+        for status in ('untreated', 'accepted', 'expired', 'rejected'):
+            queryset = getattr(RegistrationProfile.objects, status)()
+            self.assertEqual([p.user.username for p in queryset], [status])
+            # chainable
+            self.assertEqual(queryset.filter(user__username=status).count(), 1)
+            self.assertEqual(profiles[status].status, status)
+
+        queryset = RegistrationProfile.objects.with_effective_status()
+        self.assertEqual(
+            dict(queryset.values_list('user__username', 'effective_status')),
+            dict((status, status) for status in profiles))
+        self.assertEqual(
+            queryset.filter(user__username='expired')[0].effective_status,
+            'expired')
+
     def test_rejected_user_deletion(self):
         RegistrationProfile.objects.register(
             username='new_untreated_user',
@@ -673,6 +1204,9 @@ class RegistrationProfileManagerTestCase(TestCase):
         expired_untreated_user.save()
         expired_accepted_user.date_joined -= delta
         expired_accepted_user.save()
+        expired_accepted_profile = expired_accepted_user.registration_profile
+        expired_accepted_profile.expires_at -= delta
+        expired_accepted_profile.save()
         expired_rejected_user.date_joined -= delta
         expired_rejected_user.save()
 
@@ -742,10 +1276,13 @@ class RegistrationProfileManagerTestCase(TestCase):
         expired_untreated_user.save()
         expired_accepted_user.date_joined -= delta
         expired_accepted_user.save()
+        expired_accepted_profile = expired_accepted_user.registration_profile
+        expired_accepted_profile.expires_at -= delta
+        expired_accepted_profile.save()
         expired_rejected_user.date_joined -= delta
         expired_rejected_user.save()
 
-        management.call_command('cleanup_expired_registrations')
+        management.call_command('cleanup_expired_registrations', stdout=StringIO())
         # Only expired_accepted_user is deleted
         User = get_user_model()
         self.assertEqual(RegistrationProfile.objects.count(), 5)
@@ -807,10 +1344,13 @@ class RegistrationProfileManagerTestCase(TestCase):
         expired_untreated_user.save()
         expired_accepted_user.date_joined -= delta
         expired_accepted_user.save()
+        expired_accepted_profile = expired_accepted_user.registration_profile
+        expired_accepted_profile.expires_at -= delta
+        expired_accepted_profile.save()
         expired_rejected_user.date_joined -= delta
         expired_rejected_user.save()
 
-        management.call_command('cleanup_rejected_registrations')
+        management.call_command('cleanup_rejected_registrations', stdout=StringIO())
         # new_rejected_user and expired_rejected_user are deleted
         User = get_user_model()
         self.assertEqual(RegistrationProfile.objects.count(), 4)
@@ -874,10 +1414,13 @@ class RegistrationProfileManagerTestCase(TestCase):
         expired_untreated_user.save()
         expired_accepted_user.date_joined -= delta
         expired_accepted_user.save()
+        expired_accepted_profile = expired_accepted_user.registration_profile
+        expired_accepted_profile.expires_at -= delta
+        expired_accepted_profile.save()
         expired_rejected_user.date_joined -= delta
         expired_rejected_user.save()
 
-        management.call_command('cleanup_registrations')
+        management.call_command('cleanup_registrations', stdout=StringIO())
         # new_rejected_user, expired rejected_user and expired_accepted_user
         # are deleted
         User = get_user_model()
@@ -944,11 +1487,14 @@ class RegistrationProfileManagerTestCase(TestCase):
         expired_untreated_user.save()
         expired_accepted_user.date_joined -= delta
         expired_accepted_user.save()
+        expired_accepted_profile = expired_accepted_user.registration_profile
+        expired_accepted_profile.expires_at -= delta
+        expired_accepted_profile.save()
         expired_rejected_user.date_joined -= delta
         expired_rejected_user.save()
 
         # django-registration compatibility
-        management.call_command('cleanupregistration')
+        management.call_command('cleanupregistration', stdout=StringIO())
         # new_rejected_user, expired rejected_user and expired_accepted_user
         # are deleted
         User = get_user_model()
@@ -959,3 +1505,233 @@ class RegistrationProfileManagerTestCase(TestCase):
                           username='expired_rejected_user')
         self.assertRaises(User.DoesNotExist, User.objects.get,
                           username='expired_accepted_user')
+
+    def _create_rejected_users(self, count):
+        for i in range(count):
+            user = RegistrationProfile.objects.register(
+                username='rejected_user%d' % i,
+                email='rejected_user%d@example.com' % i,
+                site=self.mock_site, send_email=False,
+            )
+            RegistrationProfile.objects.reject_registration(
+                user.registration_profile,
+                site=self.mock_site, send_email=False,
+            )
+
+    def test_management_command_cleanup_dry_run(self):
+        self._create_rejected_users(3)
+
+        out = StringIO()
+        management.call_command('cleanup_rejected_registrations',
+                                dry_run=True, batch_size=2, stdout=out)
+        self.assertEqual(RegistrationProfile.objects.count(), 3)
+
+    def test_management_command_cleanup_reports_batches(self):
+        self._create_rejected_users(3)
+
+        out = StringIO()
+        management.call_command('cleanup_rejected_registrations',
+                                batch_size=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        # a line for each batch and the total
+        self.assertEqual(len(lines), 3)
+        for line in lines:
+            self.failUnless('rows/s' in line)
+        self.failUnless(lines[0].startswith('Deleted 2 registrations'))
+        self.failUnless(lines[2].startswith('Deleted 3 registrations'))
+
+    def test_delete_users_in_batches_keeps_active_users(self):
+        self._create_rejected_users(2)
+        User = get_user_model()
+        User.objects.filter(username='rejected_user0').update(is_active=True)
+
+        # the queryset does not exclude active users
+        deleted = sum(count for count, last_pk in
+                      RegistrationProfile.objects.delete_users_in_batches(
+                          RegistrationProfile.objects.rejected()))
+        self.assertEqual(deleted, 2)
+        self.assertEqual(RegistrationProfile.objects.count(), 0)
+        # the active user is kept
+        self.assertEqual(list(User.objects.filter(
+            username__startswith='rejected_user').values_list(
+            'username', flat=True)), ['rejected_user0'])
+
+    def test_management_command_cleanup_max_runtime_and_resume(self):
+        self._create_rejected_users(5)
+        pks = list(RegistrationProfile.objects.order_by(
+            'pk').values_list('pk', flat=True))
+
+        out = StringIO()
+        management.call_command('cleanup_rejected_registrations',
+                                batch_size=2, max_runtime=0, stdout=out)
+        # only the first batch is deleted and the watermark is reported
+        self.assertEqual(RegistrationProfile.objects.count(), 3)
+        self.assertTrue('--start-after=%d' % pks[1] in out.getvalue())
+
+        # dry run does not delete anything thus the watermark is required
+        # to walk through the remaining registrations
+        out = StringIO()
+        management.call_command('cleanup_rejected_registrations',
+                                batch_size=2, max_runtime=0, dry_run=True,
+                                start_after=pks[3], stdout=out)
+        self.assertTrue('--start-after=%d' % pks[4] in out.getvalue())
+
+        management.call_command('cleanup_rejected_registrations',
+                                batch_size=2, start_after=pks[1],
+                                stdout=StringIO())
+        self.assertEqual(RegistrationProfile.objects.count(), 0)
+
+
+@override_settings(
+    ACCOUNT_ACTIVATION_DAYS=7,
+    REGISTRATION_OPEN=True,
+    REGISTRATION_SUPPLEMENT_CLASS=None,
+    REGISTRATION_BACKEND_CLASS=(
+        'registration.backends.default.DefaultRegistrationBackend'),
+)
+class RegistrationProfileIndexTestCase(TestCase):
+
+    def get_query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN %s' % sql, params)
+        # the last column is the human readable detail of each step
+        return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexUsed(self, queryset):
+        if connection.vendor != 'sqlite':
+            # EXPLAIN QUERY PLAN is SQLite specific
+            return
+        plan = self.get_query_plan(queryset)
+        self.failUnless(plan)
+        for detail in plan:
+            self.failUnless('INDEX' in detail,
+                            'Full table scan: %s' % detail)
+
+    def test_activation_key_lookup_uses_index(self):
+        self.assertIndexUsed(RegistrationProfile.objects.filter(
+            _status='accepted', activation_key=generate_activation_key('a')))
+
+    def test_status_lookup_uses_index(self):
+        self.assertIndexUsed(RegistrationProfile.objects.filter(
+            _status='untreated'))
+
+
+@override_settings(
+    ACCOUNT_ACTIVATION_DAYS=7,
+    REGISTRATION_OPEN=True,
+    REGISTRATION_SUPPLEMENT_CLASS=None,
+    REGISTRATION_EMAIL_OUTBOX=True,
+    REGISTRATION_BACKEND_CLASS=(
+        'registration.backends.default.DefaultRegistrationBackend'),
+)
+class EmailOutboxTestCase(TestCase):
+    def setUp(self):
+        self.mock_site = mock_site()
+
+    def _register(self, username='alice'):
+        return RegistrationProfile.objects.register(
+            username=username, email='%s@example.com' % username,
+            site=self.mock_site)
+
+    def test_emails_are_queued(self):
+        new_user = self._register()
+        RegistrationProfile.objects.reject_registration(
+            new_user.registration_profile, site=self.mock_site)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+        email = EmailOutbox.objects.order_by('pk')[0]
+        self.assertEqual(email.recipient_list, ['alice@example.com'])
+
+    def test_emails_are_rolled_back_with_transaction(self):
+        try:
+            with transaction_atomic():
+                self._register()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(EmailOutbox.objects.count(), 0)
+
+    def test_management_command_send_outbox(self):
+        self._register('alice')
+        self._register('bob')
+        management.call_command('registration_send_outbox',
+                                stdout=StringIO())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['alice@example.com', 'bob@example.com'])
+        self.assertEqual(EmailOutbox.objects.count(), 0)
+
+    @override_settings(
+        EMAIL_BACKEND='registration.tests.mock.FailingEmailBackend')
+    def test_management_command_send_outbox_retry(self):
+        self._register()
+        management.call_command('registration_send_outbox',
+                                max_attempts=2, backoff=60,
+                                stdout=StringIO())
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.failUnless('closed' in email.last_error)
+        self.failUnless(email.next_attempt_at > datetime_now())
+        # the email is not due yet
+        self.assertEqual(EmailOutbox.objects.due().count(), 0)
+
+        EmailOutbox.objects.update(next_attempt_at=datetime_now())
+        management.call_command('registration_send_outbox',
+                                max_attempts=2, stdout=StringIO())
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, 'dead')
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(EmailOutbox.objects.due().count(), 0)
+
+        with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            management.call_command('registration_send_outbox',
+                                    requeue_dead=True, stdout=StringIO())
+        self.assertEqual(EmailOutbox.objects.count(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_claim(self):
+        self._register('alice')
+        self._register('bob')
+        pks = list(EmailOutbox.objects.values_list('pk', flat=True))
+        # another sender has claimed the first email
+        self.assertEqual(EmailOutbox.objects.claim(pks[:1]), pks[:1])
+        self.assertEqual(EmailOutbox.objects.claim(pks), pks[1:])
+        self.assertEqual(EmailOutbox.objects.due().count(), 0)
+
+    def test_send_batch_skips_claimed_emails(self):
+        self._register('alice')
+        self._register('bob')
+        claimed = EmailOutbox.objects.claim(
+            EmailOutbox.objects.filter(recipients='alice@example.com'
+                                       ).values_list('pk', flat=True))
+        self.assertEqual(EmailOutbox.objects.send_batch(), (1, 0, 0))
+        self.assertEqual([m.to[0] for m in mail.outbox], ['bob@example.com'])
+        # the claimed email is kept for its sender
+        self.assertEqual(list(EmailOutbox.objects.values_list(
+            'pk', flat=True)), claimed)
+
+
+class TemplateCacheTestCase(TestCase):
+    template_name = 'registration/rejection_email_subject.txt'
+
+    @override_settings(DEBUG=False)
+    def test_compiled_template_is_cached(self):
+        template = get_compiled_template(self.template_name)
+        self.failUnless(get_compiled_template(self.template_name) is template)
+
+    @override_settings(DEBUG=True)
+    def test_compiled_template_is_not_cached_in_debug(self):
+        template = get_compiled_template(self.template_name)
+        self.failIf(get_compiled_template(self.template_name) is template)
+
+    def test_render_many(self):
+        User = get_user_model()
+        site = mock_site()
+        users = [User(username='alice'), User(username='bob')]
+        results = render_many('registration/registration_email.txt', [
+            {'user': user, 'site': site} for user in users])
+        self.assertEqual(len(results), 2)
+        self.failUnless('alice' in results[0])
+        self.failUnless('bob' in results[1])
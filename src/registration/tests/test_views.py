@@ -2,19 +2,31 @@
 """
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+import json
+import time
 import datetime
 from django.test import TestCase
+from django.test.client import RequestFactory
 from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
 from django.core.urlresolvers import reverse
 
 from registration.compat import get_user_model
 from registration import forms
+from registration import models
+from registration import views
 from registration.models import RegistrationProfile
+from registration.utils import generate_activation_key
+from registration.utils import remember_invalid_activation_key
+from registration.utils import is_invalid_activation_key_cached
 from registration.backends.default import DefaultRegistrationBackend
 
 from registration.tests.compat import override_settings
+from registration.tests.compat import CaptureQueriesContext
 from registration.tests.mock import mock_request
+from registration.tests.mock import mock_background_email_dispatcher
 
 
 @override_settings(
@@ -29,7 +41,7 @@ class RegistrationViewTestCase(TestCase):
     def setUp(self):
         self.backend = DefaultRegistrationBackend()
         self.mock_request = mock_request()
-
+        cache.clear()
 
     def test_registration_view_get(self):
         """
@@ -96,6 +108,205 @@ class RegistrationViewTestCase(TestCase):
         self.assertEqual(profile.user.username, 'alice')
         self.assertEqual(profile.user.email, 'alice@example.com')
 
+    @override_settings(REGISTRATION_COMPLETE_TOKEN=True)
+    def test_registration_complete_view_get_token(self):
+        """
+        A ``GET`` to the ``complete`` view with a signed token populates the
+        registration profile with a single query and without the session
+
+        """
+        response = self.client.post(reverse('registration_register'),
+                                    data={'username': 'alice',
+                                          'email1': 'alice@example.com',
+                                          'email2': 'alice@example.com'})
+        self.failIf('registration_profile_pk' in self.client.session)
+        complete_url = response['Location']
+        self.failUnless('?token=' in complete_url)
+        # the token does not disclose the username and the email
+        self.failIf('alice' in complete_url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(complete_url)
+        self.assertEqual(response.status_code, 200)
+        profile = response.context['registration_profile']
+        self.assertEqual(profile.pk, RegistrationProfile.objects.get().pk)
+        self.assertEqual(profile.user.username, 'alice')
+        self.assertEqual(profile.user.email, 'alice@example.com')
+
+        # tampered token
+        response = self.client.get(complete_url + 'x')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['registration_profile'], None)
+
+    def test_availability_view(self):
+        """
+        A ``GET`` to the ``availability`` view returns the availability of
+        username and email and caches the answers
+
+        """
+        User = get_user_model()
+        User.objects.create_user('alice', 'alice@example.com')
+        url = reverse('registration_availability')
+
+        response = self.client.get(url, {'username': 'Alice',
+                                         'email': 'alice@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        result = json.loads(response.content)
+        self.failIf(result['username']['available'])
+        self.assertEqual(result['username']['errors'],
+                         [u"A user with that username already exists."])
+        # an email address in use is not available even if
+        # ``RegistrationForm`` accepts it
+        self.failIf(result['email']['available'])
+        self.assertEqual(len(result['email']['errors']), 1)
+
+        response = self.client.get(url, {'email': 'bob@example.com'})
+        self.failUnless(json.loads(response.content)['email']['available'])
+
+        response = self.client.get(url, {'username': 'bob bob'})
+        result = json.loads(response.content)
+        self.failIf(result['username']['available'])
+        self.failIf('email' in result)
+
+        # the answers are cached
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'username': 'alice'})
+        self.failIf(json.loads(response.content)['username']['available'])
+
+    def test_availability_view_unique_email(self):
+        User = get_user_model()
+        User.objects.create_user('alice', 'alice@example.com')
+        request = RequestFactory().get(reverse('registration_availability'),
+                                       {'email': 'Alice@example.com'})
+        view = views.AvailabilityView.as_view(
+            form_class=forms.RegistrationFormUniqueEmail)
+        result = json.loads(view(request).content)
+        self.failIf(result['email']['available'])
+
+    def test_availability_view_form_class(self):
+        """
+        The answers are cached for each form class
+        """
+        url = reverse('registration_availability')
+        response = self.client.get(url, {'email': 'bob@gmail.com'})
+        self.failUnless(json.loads(response.content)['email']['available'])
+
+        request = RequestFactory().get(url, {'email': 'bob@gmail.com'})
+        view = views.AvailabilityView.as_view(
+            form_class=forms.RegistrationFormNoFreeEmail)
+        result = json.loads(view(request).content)
+        self.failIf(result['email']['available'])
+
+    def test_availability_view_registration(self):
+        """
+        Registration removes the cached availability of the username
+        """
+        url = reverse('registration_availability')
+        response = self.client.get(url, {'username': 'alice'})
+        self.failUnless(json.loads(response.content)['username']['available'])
+
+        self.client.post(reverse('registration_register'),
+                         data={'username': 'alice',
+                               'email1': 'alice@example.com',
+                               'email2': 'alice@example.com'})
+        response = self.client.get(url, {'username': 'alice'})
+        self.failIf(json.loads(response.content)['username']['available'])
+
+    def test_nonblocking_registration_view_post_success(self):
+        """
+        A ``POST`` to the ``NonBlockingRegistrationView`` registers the user
+        and passes the registration email to the background dispatcher
+        through the outbox
+
+        """
+        request = RequestFactory().post(reverse('registration_register'),
+                                        data={'username': 'alice',
+                                              'email1': 'alice@example.com',
+                                              'email2': 'alice@example.com'})
+        request.session = self.mock_request.session
+        with mock_background_email_dispatcher() as dispatcher:
+            response = views.NonBlockingRegistrationView.as_view()(request)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(RegistrationProfile.objects.count(), 1)
+
+        self.assertEqual(len(mail.outbox), 0)
+        email = models.EmailOutbox.objects.get(recipients='alice@example.com')
+        # other emails (e.g. notification) are passed together
+        pks = list(models.EmailOutbox.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        self.failUnless(email.pk in pks)
+        self.assertEqual(dispatcher.submitted, [pks])
+
+    @override_settings(REGISTRATION_THROTTLES={'register': {'ip': (2, 60)}})
+    def test_registration_view_throttle_ip(self):
+        """
+        Requests to the ``RegistrationView`` over the per-IP bucket are
+        answered with 429 without the database
+
+        """
+        url = reverse('registration_register')
+        for i in range(2):
+            response = self.client.post(url, data={})
+            self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.post(url, data={})
+        self.assertEqual(response.status_code, 429)
+        self.failUnless(int(response['Retry-After']) > 0)
+
+        # another IP has its own bucket
+        response = self.client.post(url, data={}, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(REGISTRATION_THROTTLES={'register': {'ip': (1, 3600)}})
+    def test_registration_view_throttle_post_only(self):
+        """
+        Only ``POST`` requests to the ``RegistrationView`` are throttled
+
+        """
+        url = reverse('registration_register')
+        for i in range(3):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, data={})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, data={})
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(REGISTRATION_THROTTLES={
+        'register': {'ip': (1, 3600), 'global': (1, 3600)}})
+    def test_registration_view_throttle_global_keeps_ip(self):
+        """
+        Requests rejected by the global counter are not counted by the
+        per-IP counter
+
+        """
+        url = reverse('registration_register')
+        response = self.client.post(url, data={}, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, data={}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+
+        # the global window is over
+        cache.delete('registration.throttle.register.global.%d' % (
+            time.time() // 3600))
+        response = self.client.post(url, data={}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(REGISTRATION_THROTTLES={'activate': {'global': (1, 60)}})
+    def test_activation_view_throttle_global(self):
+        """
+        Requests to the ``ActivationView`` over the global bucket are
+        answered with 429
+
+        """
+        url = reverse('registration_activate', kwargs={
+            'activation_key': 'a' * 40})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+
     def test_registration_view_closed(self):
         """
         Any attempt to access the ``register`` view when registration
@@ -151,6 +362,70 @@ class RegistrationViewTestCase(TestCase):
         response = self.client.get(activation_url)
         self.assertEqual(response.status_code, 404)
 
+    @override_settings(REGISTRATION_SIGNED_ACTIVATION_KEY=True)
+    def test_activation_view_get_signed_key(self):
+        """
+        A ``GET`` to the ``ActivationView`` view with tampered signed
+        activation_key raise Http404 without touching database
+
+        """
+        new_user = self.backend.register(username='alice', email='alice@example.com', request=self.mock_request)
+        new_user = self.backend.accept(new_user.registration_profile, request=self.mock_request)
+        activation_key = new_user.registration_profile.activation_key
+
+        activation_url = reverse('registration_activate', kwargs={
+            'activation_key': activation_key})
+        response = self.client.get(activation_url)
+        self.assertEqual(response.status_code, 200)
+
+        activation_url = reverse('registration_activate', kwargs={
+            'activation_key': activation_key[:-1] + (
+                '0' if activation_key[-1] != '0' else '1')})
+        with self.assertNumQueries(0):
+            response = self.client.get(activation_url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_activation_view_negative_cache(self):
+        """
+        A repeated ``GET`` to the ``ActivationView`` view with unknown
+        activation_key raise Http404 without touching database
+
+        """
+        cache.clear()
+        activation_url = reverse('registration_activate', kwargs={
+            'activation_key': generate_activation_key('alice')})
+
+        response = self.client.get(activation_url)
+        self.assertEqual(response.status_code, 404)
+        with self.assertNumQueries(0):
+            response = self.client.get(activation_url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_activation_view_negative_cache_invalidation(self):
+        """
+        Accepting a registration remove the issued activation_key from the
+        negative cache
+
+        """
+        cache.clear()
+        activation_key = generate_activation_key('alice')
+        remember_invalid_activation_key(activation_key)
+        self.failUnless(is_invalid_activation_key_cached(activation_key))
+
+        generate = models._generate_activation_key
+        models._generate_activation_key = lambda *args: activation_key
+        try:
+            new_user = self.backend.register(username='alice', email='alice@example.com', request=self.mock_request)
+            self.backend.accept(new_user.registration_profile, request=self.mock_request)
+        finally:
+            models._generate_activation_key = generate
+        self.failIf(is_invalid_activation_key_cached(activation_key))
+
+        activation_url = reverse('registration_activate', kwargs={
+            'activation_key': activation_key})
+        response = self.client.get(activation_url)
+        self.assertEqual(response.status_code, 200)
+
     def test_activation_view_post_success(self):
         """
         A ``POST`` to the ``ActivationView`` view with valid data properly
@@ -176,6 +451,40 @@ class RegistrationViewTestCase(TestCase):
         self.assertEqual(len(mail.outbox), 3)
         self.failUnless(User.objects.get(username='alice').is_active)
 
+    @override_settings(REGISTRATION_ACTIVATION_EMAIL=False,
+                       REGISTRATION_AUTO_LOGIN=False)
+    def test_activation_view_post_queries(self):
+        """
+        A ``POST`` to the ``ActivationView`` look up the profile and the user
+        only once
+
+        """
+        new_user = self.backend.register(username='alice', email='alice@example.com', request=self.mock_request)
+        new_user = self.backend.accept(new_user.registration_profile, request=self.mock_request)
+
+        activation_url = reverse('registration_activate', kwargs={
+            'activation_key': new_user.registration_profile.activation_key})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(activation_url,{
+                'password1': 'swordfish',
+                'password2': 'swordfish'})
+        # the savepoints are issued only because the test case runs in a
+        # transaction
+        statements = [query['sql'] for query in queries.captured_queries
+                      if 'SAVEPOINT' not in query['sql']]
+        # a SELECT of the profile with the user, an UPDATE which activates
+        # the user (and claims the profile) and DELETEs of the supplement and
+        # the profile
+        self.assertEqual(len(statements), 4, statements)
+        self.failIf([sql for sql in statements if 'UPDATE' in sql and
+                     'registration_registrationprofile' in sql])
+
+        success_redirect = 'http://testserver%s' % reverse('registration_activation_complete')
+        self.assertRedirects(response, success_redirect)
+        self.assertEqual(RegistrationProfile.objects.count(), 0)
+        self.failUnless(get_user_model().objects.get(username='alice').is_active)
+
     def test_activation_view_post_failure(self):
         """
         A ``POST`` to the ``ActivationView`` view with invalid data does not
@@ -184,8 +493,9 @@ class RegistrationViewTestCase(TestCase):
         """
         expired_user = self.backend.register(username='alice', email='alice@example.com', request=self.mock_request)
         expired_user = self.backend.accept(expired_user.registration_profile, request=self.mock_request)
-        expired_user.date_joined -= datetime.timedelta(days=settings.ACCOUNT_ACTIVATION_DAYS+1)
-        expired_user.save()
+        expired_profile = expired_user.registration_profile
+        expired_profile.expires_at -= datetime.timedelta(days=settings.ACCOUNT_ACTIVATION_DAYS+1)
+        expired_profile.save()
     
         activation_url = reverse('registration_activate', kwargs={
             'activation_key': expired_user.registration_profile.activation_key})
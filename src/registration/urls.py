@@ -3,14 +3,22 @@
 URLconf for django-inspectional-registration
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+from registration.conf import settings
 from registration.compat import url
 from registration.compat import patterns
 
-from registration.views import RegistrationView
 from registration.views import RegistrationClosedView
 from registration.views import RegistrationCompleteView
-from registration.views import ActivationView
 from registration.views import ActivationCompleteView
+from registration.views import AvailabilityView
+if settings.REGISTRATION_NONBLOCKING_VIEWS:
+    from registration.views import NonBlockingRegistrationView as \
+        RegistrationView
+    from registration.views import NonBlockingActivationView as \
+        ActivationView
+else:
+    from registration.views import RegistrationView
+    from registration.views import ActivationView
 
 urlpatterns = patterns('',
     url(r'^activate/complete/$', ActivationCompleteView.as_view(),
@@ -23,10 +31,11 @@ urlpatterns = patterns('',
         name='registration_disallowed'),
     url(r'^register/complete/$', RegistrationCompleteView.as_view(),
         name='registration_complete'),
+    url(r'^register/availability/$', AvailabilityView.as_view(),
+        name='registration_availability'),
 )
 
 # django.contrib.auth
-from registration.conf import settings
 from django.contrib.auth import views as auth_views
 if settings.REGISTRATION_DJANGO_AUTH_URLS_ENABLE:
     prefix = settings.REGISTRATION_DJANGO_AUTH_URL_NAMES_PREFIX
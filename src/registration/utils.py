@@ -3,11 +3,36 @@
 Utilities for django-inspectional-registration
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+import re
+import math
+import time
 import random
+import Queue
+import calendar
+import threading
+import multiprocessing
+from contextlib import contextmanager
 
 from django.contrib.sites.models import Site
 from django.contrib.sites.models import RequestSite
+from django.utils.http import int_to_base36
+from django.utils.http import base36_to_int
+from django.utils.crypto import salted_hmac
+from django.utils.crypto import constant_time_compare
 from registration.compat import sha1
+from registration.compat import datetime_now
+from registration.compat import connect_setting_changed
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+SHA1_RE = re.compile(r'^[a-f0-9]{40}$')
+SIGNED_KEY_RE = re.compile(
+    r'^(?P<pk>[0-9a-z]{1,7})_(?P<expires>[0-9a-z]{1,7})_'
+    r'(?P<nonce>[0-9a-z]{6})_(?P<signature>[0-9a-f]{16})$')
+SIGNED_KEY_SALT = 'registration.utils.generate_signed_activation_key'
+REGISTRATION_TOKEN_SALT = 'registration.utils.generate_registration_token'
 
 
 def get_site(request):
@@ -38,6 +63,253 @@ def generate_activation_key(username):
     return activation_key
 
 
+def _timestamp(value):
+    """convert aware or naive ``datetime`` into an unix timestamp"""
+    if value.tzinfo is not None:
+        return calendar.timegm(value.utctimetuple())
+    return int(time.mktime(value.timetuple()))
+
+
+def _sign_activation_key(pk36, expires36, nonce):
+    value = '%s_%s_%s' % (pk36, expires36, nonce)
+    return salted_hmac(SIGNED_KEY_SALT, value).hexdigest()[:16]
+
+
+def generate_signed_activation_key(pk, expires_at):
+    """generate signed activation key with profile pk and expiration date
+
+    The key is ``<pk>_<expires>_<nonce>_<signature>`` where ``pk`` and
+    ``expires`` are base36 encoded, ``nonce`` is a random string and
+    ``signature`` is a HMAC of the others with ``SECRET_KEY``. The key fits
+    in 40 characters and is matched by ``\w+`` in the activation url, thus
+    it can be stored in ``activation_key`` in place of the SHA1 one.
+
+    Use ``validate_activation_key`` to check the key without database.
+    """
+    pk36 = int_to_base36(pk)
+    expires36 = int_to_base36(_timestamp(expires_at))
+    nonce = ''.join([random.choice('0123456789abcdefghijklmnopqrstuvwxyz')
+                     for i in xrange(6)])
+    signature = _sign_activation_key(pk36, expires36, nonce)
+    return '%s_%s_%s_%s' % (pk36, expires36, nonce, signature)
+
+
+def validate_activation_key(activation_key):
+    """validate activation key without touching database
+
+    Return ``False`` when ``activation_key`` is neither a SHA1 key generated
+    by ``generate_activation_key`` nor a signed key generated by
+    ``generate_signed_activation_key``. Signed keys are also rejected when
+    the signature does not match or the key has expired.
+
+    Returning ``True`` does not mean the key exists; the key still have to be
+    looked up in database.
+    """
+    if not activation_key:
+        return False
+    if SHA1_RE.match(activation_key):
+        return True
+    m = SIGNED_KEY_RE.match(activation_key)
+    if not m:
+        return False
+    signature = _sign_activation_key(
+        m.group('pk'), m.group('expires'), m.group('nonce'))
+    if not constant_time_compare(signature, m.group('signature')):
+        return False
+    expires = base36_to_int(m.group('expires'))
+    return expires > _timestamp(datetime_now())
+
+
+def _invalid_activation_key_cache_key(activation_key):
+    return 'registration.invalid_activation_key.%s' % activation_key
+
+
+def remember_invalid_activation_key(activation_key):
+    """remember ``activation_key`` as invalid in the negative cache
+
+    The key is kept for ``REGISTRATION_INVALID_ACTIVATION_KEY_CACHE_TIMEOUT``
+    seconds in the default cache. The cache backend is responsible for
+    bounding the number of keys (e.g. ``MAX_ENTRIES`` of ``LocMemCache``).
+    Nothing is cached when the timeout is ``0`` or ``None``.
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+    timeout = settings.REGISTRATION_INVALID_ACTIVATION_KEY_CACHE_TIMEOUT
+    if timeout:
+        cache.set(_invalid_activation_key_cache_key(activation_key),
+                  True, timeout)
+
+
+def is_invalid_activation_key_cached(activation_key):
+    """return ``True`` if ``activation_key`` is in the negative cache"""
+    from django.conf import settings
+    from django.core.cache import cache
+    if not settings.REGISTRATION_INVALID_ACTIVATION_KEY_CACHE_TIMEOUT:
+        return False
+    return bool(cache.get(_invalid_activation_key_cache_key(activation_key)))
+
+
+def forget_invalid_activation_keys(activation_keys):
+    """remove newly issued ``activation_keys`` from the negative cache"""
+    from django.conf import settings
+    from django.core.cache import cache
+    if not settings.REGISTRATION_INVALID_ACTIVATION_KEY_CACHE_TIMEOUT:
+        return
+    cache.delete_many([_invalid_activation_key_cache_key(activation_key)
+                       for activation_key in activation_keys])
+
+
+def generate_registration_token(profile):
+    """generate a signed token of newly registered ``profile``
+
+    The token carries only the ids of the profile and the user because it
+    is signed but not encrypted and appears in URLs (access logs, browser
+    history and ``Referer`` headers). ``RegistrationCompleteView`` uses it
+    instead of the session. It requires Django 1.4 or later.
+    """
+    from django.core import signing
+    return signing.dumps([profile.pk, profile.user_id],
+                         salt=REGISTRATION_TOKEN_SALT)
+
+
+def load_registration_token(token, max_age=None):
+    """load the data signed by ``generate_registration_token``
+
+    Returning ``None`` if ``token`` is tampered or older than ``max_age``
+    seconds.
+    """
+    from django.core import signing
+    try:
+        return signing.loads(token, salt=REGISTRATION_TOKEN_SALT,
+                             max_age=max_age)
+    except signing.BadSignature:
+        # SignatureExpired is a subclass of BadSignature
+        return None
+
+
+def _availability_cache_key(form_class, field, value):
+    value = value.lower()
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return 'registration.availability.%s.%s.%s.%s' % (
+        form_class.__module__, form_class.__name__, field,
+        sha1(value).hexdigest())
+
+
+def get_cached_availability(form_class, field, value):
+    """get the cached availability of ``value`` of ``field`` of registration
+    form ``form_class`` or ``None`` if it has not been cached"""
+    from django.conf import settings
+    from django.core.cache import cache
+    if not settings.REGISTRATION_AVAILABILITY_CACHE_TIMEOUT:
+        return None
+    return cache.get(_availability_cache_key(form_class, field, value))
+
+
+def cache_availability(form_class, field, value, availability):
+    """cache the ``availability`` of ``value`` of ``field`` of registration
+    form ``form_class``
+
+    Both positive and negative answers are kept for
+    ``REGISTRATION_AVAILABILITY_CACHE_TIMEOUT`` seconds in the default cache.
+    Nothing is cached when the timeout is ``0`` or ``None``.
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+    timeout = settings.REGISTRATION_AVAILABILITY_CACHE_TIMEOUT
+    if timeout:
+        cache.set(_availability_cache_key(form_class, field, value),
+                  availability, timeout)
+
+
+def forget_availability(form_classes, **fields):
+    """remove the cached availability of the values of registration form
+    fields (e.g. ``username`` and ``email1`` of newly registered user) of
+    each registration form in ``form_classes``"""
+    from django.conf import settings
+    from django.core.cache import cache
+    if not settings.REGISTRATION_AVAILABILITY_CACHE_TIMEOUT:
+        return
+    cache.delete_many([_availability_cache_key(form_class, field, value)
+                       for form_class in set(form_classes)
+                       for field, value in fields.items() if value])
+
+
+def count_throttle_request(key, limit, period):
+    """count a request in the fixed window counter ``key`` of the default
+    cache
+
+    The counter of the current window of ``period`` seconds is created with
+    ``cache.add`` and counted up with ``cache.incr`` thus concurrent requests
+    are counted atomically when the cache backend increments atomically
+    (e.g. memcached). Returning ``0`` when the request is within ``limit``
+    requests of the window, otherwise the number of seconds until the next
+    window.
+    """
+    from django.core.cache import cache
+    now = time.time()
+    window = int(now // period)
+    key = '%s.%d' % (key, window)
+    # the counter is kept a little longer than the window
+    cache.add(key, 0, int(math.ceil(period)) + 1)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # the counter has been evicted between ``add`` and ``incr``
+        cache.add(key, 1, int(math.ceil(period)) + 1)
+        count = 1
+    if count <= limit:
+        return 0
+    return (window + 1) * period - now
+
+
+def uncount_throttle_request(key, period):
+    """take back the request counted by ``count_throttle_request``"""
+    from django.core.cache import cache
+    key = '%s.%d' % (key, int(time.time() // period))
+    try:
+        cache.decr(key)
+    except ValueError:
+        pass
+
+
+def throttle(scope, ident):
+    """count a request in the per-IP and the global counters of ``scope``
+
+    The counters are specified by ``REGISTRATION_THROTTLES`` setting like::
+
+        REGISTRATION_THROTTLES = {
+            # 5 requests per minute for each IP and 100 requests per second
+            'register': {'ip': (5, 60), 'global': (100, 1)},
+        }
+
+    ``ident`` is the IP address of the client. Returning ``0`` when the
+    request is allowed, otherwise the number of seconds to wait. A request
+    rejected by the per-IP counter is not counted by the global counter and
+    a request rejected by the global counter is taken back from the per-IP
+    counter, thus rejected requests do not use up the allowance of the
+    other counter.
+    """
+    from django.conf import settings
+    counters = settings.REGISTRATION_THROTTLES.get(scope)
+    if not counters:
+        return 0
+    ip_key = None
+    if 'ip' in counters:
+        ip_key = 'registration.throttle.%s.ip.%s' % (scope, ident)
+        wait = count_throttle_request(ip_key, *counters['ip'])
+        if wait:
+            return wait
+    if 'global' in counters:
+        key = 'registration.throttle.%s.global' % scope
+        wait = count_throttle_request(key, *counters['global'])
+        if wait:
+            if ip_key:
+                uncount_throttle_request(ip_key, counters['ip'][1])
+            return wait
+    return 0
+
+
 def generate_random_password(length=10):
     """generate random password with passed length"""
     # Without 1, l, O, 0 because those character are hard to tell
@@ -47,12 +319,469 @@ def generate_random_password(length=10):
     return password
 
 
-def send_mail(subject, message, from_email, recipients):
+def make_passwords(passwords, processes=None):
+    """hash ``passwords`` and return the hashes
+
+    The passwords are hashed in the current process unless ``processes`` is
+    more than ``1``. Otherwise they are hashed on a pool of ``processes``
+    worker processes because the password hashing is CPU bound (and slow by
+    design). The pool forks the current process thus it should be used only
+    from management commands, never in a web or admin request.
+    """
+    from registration.compat import make_password
+    passwords = list(passwords)
+    processes = min(processes or 1, len(passwords))
+    if processes <= 1:
+        return [make_password(password) for password in passwords]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(make_password, passwords)
+    finally:
+        pool.close()
+        pool.join()
+
+
+_compiled_templates = {}
+
+
+def get_compiled_template(template_name):
+    """get the compiled template of ``template_name``
+
+    The template is resolved and compiled once per process and cached. The
+    cache is not used when ``DEBUG`` is ``True`` thus modified templates are
+    reflected immediately during development.
+    """
+    from django.conf import settings
+    from django.template.loader import get_template
+    if settings.DEBUG:
+        return get_template(template_name)
+    template = _compiled_templates.get(template_name)
+    if template is None:
+        template = get_template(template_name)
+        _compiled_templates[template_name] = template
+    return template
+
+
+def clear_template_cache():
+    """clear the compiled templates cached by ``get_compiled_template``"""
+    _compiled_templates.clear()
+
+
+def _render_template(template, context):
+    if hasattr(template, 'template'):
+        # Django 1.8+ returns a backend specific template which takes a dict
+        return template.render(context)
+    from django.template import Context
+    return template.render(Context(context))
+
+
+def render_to_string(template_name, context):
+    """render ``template_name`` with ``context`` (a dict) via
+    ``get_compiled_template``"""
+    return _render_template(get_compiled_template(template_name), context)
+
+
+def render_many(template_name, contexts):
+    """render ``template_name`` with each context (a dict) in ``contexts``
+    against a single compiled template, returning a list of the results"""
+    template = get_compiled_template(template_name)
+    return [_render_template(template, context) for context in contexts]
+
+
+_registry = {}
+
+
+def get_from_registry(key, factory):
+    """get the object registered as ``key`` in the process-wide registry
+
+    ``factory`` is called to create the object when ``key`` has not been
+    registered yet. The registry is used to resolve the classes and the
+    instances specified by settings (e.g. the registration backend) only once
+    per process. It is cleared when ``REGISTRATION_*`` or ``INSTALLED_APPS``
+    setting has changed.
+    """
+    try:
+        return _registry[key]
+    except KeyError:
+        obj = _registry[key] = factory()
+        return obj
+
+
+def clear_registry():
+    """clear the objects registered by ``get_from_registry``"""
+    _registry.clear()
+
+
+def _setting_changed_receiver(sender, setting, **kwargs):
+    """clear the compiled templates and the registry which depend on the
+    changed ``setting``"""
+    if setting.startswith('TEMPLATE') or setting == 'INSTALLED_APPS':
+        clear_template_cache()
+    if setting.startswith('REGISTRATION_') or setting == 'INSTALLED_APPS':
+        clear_registry()
+connect_setting_changed(_setting_changed_receiver)
+
+
+class EmailConnectionPool(object):
+    """A pool of long-lived email connections
+
+    At most ``size`` connections of ``EMAIL_BACKEND`` (or ``backend``) are
+    opened and shared. Connections are opened when they are acquired first
+    and closed when the pool is closed. A connection which raised an
+    exception is discarded and a new one is opened when it is required.
+
+    Usage::
+
+        with EmailConnectionPool(size=2) as pool:
+            with pool.connection() as connection:
+                send_mass_mail(datatuple, connection=connection)
+
+    Use ``email_connection_pool`` to make ``send_mail`` and
+    ``send_mass_mail`` use the pool implicitly.
+    """
+    def __init__(self, size=1, backend=None, **kwargs):
+        self.size = size
+        self.backend = backend
+        self.kwargs = kwargs
+        self._idle = Queue.Queue()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def acquire(self):
+        """get an idle connection, open a new one or wait for a release"""
+        from django.core.mail import get_connection
+        try:
+            return self._idle.get_nowait()
+        except Queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self.size:
+                connection = get_connection(self.backend, **self.kwargs)
+                # the connection have to be opened explicitly otherwise
+                # ``send_messages`` closes it after sending
+                connection.open()
+                self._connections.append(connection)
+                return connection
+        return self._idle.get()
+
+    def release(self, connection, discard=False):
+        """return ``connection`` to the pool or close it when ``discard``"""
+        if discard:
+            with self._lock:
+                self._connections.remove(connection)
+            try:
+                connection.close()
+            except Exception:
+                pass
+        else:
+            self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """acquire a connection in ``with`` block"""
+        connection = self.acquire()
+        try:
+            yield connection
+        except:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def close(self):
+        """close all connections of this pool"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        self._idle = Queue.Queue()
+
+
+_email_connection_pool = threading.local()
+
+
+@contextmanager
+def email_connection_pool(size=1, **kwargs):
+    """make ``send_mail`` and ``send_mass_mail`` use pooled connections
+
+    ``send_mail`` and ``send_mass_mail`` called in ``with`` block in the
+    current thread send emails over connections of an
+    ``EmailConnectionPool`` instead of opening a new connection for each
+    call. The pool is closed at the end of the block. When the block is
+    nested, the pool of the outermost block is used.
+    """
+    pool = getattr(_email_connection_pool, 'pool', None)
+    if pool is not None:
+        yield pool
+        return
+    pool = EmailConnectionPool(size, **kwargs)
+    _email_connection_pool.pool = pool
+    try:
+        yield pool
+    finally:
+        _email_connection_pool.pool = None
+        pool.close()
+
+
+class EmailDispatchError(Exception):
+    """Raised when some emails could not be sent by ``EmailDispatcher``
+
+    ``failures`` is a list of ``(datatuple_item, exception)``.
+    """
+    def __init__(self, failures):
+        self.failures = failures
+        super(EmailDispatchError, self).__init__(
+            '%d emails could not be sent: %s' % (
+                len(failures), '; '.join(set(
+                    repr(e) for item, e in failures))))
+
+
+class EmailDispatcher(object):
+    """Send emails concurrently on a bounded thread pool
+
+    ``concurrency`` worker threads send emails, each over its own connection
+    of an ``EmailConnectionPool``, thus a slow recipient does not stall the
+    others. ``submit`` blocks when ``queue_size`` emails are waiting
+    (backpressure). ``timeout`` is passed to the email backend as the socket
+    timeout of a connection, thus bounds the time spent on a single email.
+    Defaults are ``REGISTRATION_EMAIL_CONCURRENCY``,
+    ``REGISTRATION_EMAIL_QUEUE_SIZE`` and ``REGISTRATION_EMAIL_TIMEOUT``.
+
+    Usage::
+
+        dispatcher = EmailDispatcher()
+        for item in datatuple:
+            dispatcher.submit(*item)
+        sent, failures = dispatcher.join()
+
+    """
+    def __init__(self, concurrency=None, queue_size=None, timeout=None,
+                 backend=None):
+        from django.conf import settings
+        if concurrency is None:
+            concurrency = settings.REGISTRATION_EMAIL_CONCURRENCY
+        if queue_size is None:
+            queue_size = settings.REGISTRATION_EMAIL_QUEUE_SIZE
+        if timeout is None:
+            timeout = settings.REGISTRATION_EMAIL_TIMEOUT
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        self.concurrency = max(1, concurrency)
+        self.sent = 0
+        self.failures = []
+        self._pool = EmailConnectionPool(self.concurrency, backend, **kwargs)
+        self._queue = Queue.Queue(maxsize=queue_size or 0)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, subject, message, from_email, recipients):
+        """queue an email, blocking while the queue is full"""
+        if len(self._threads) < self.concurrency:
+            # start workers lazily thus a few emails use a few connections
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        self._queue.put((subject, message, from_email, recipients))
+
+    def _work(self):
+        from django.core.mail import EmailMessage
+        connection = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                if connection is None:
+                    connection = self._pool.acquire()
+                subject, message, from_email, recipients = item
+                EmailMessage(subject, message, from_email, recipients,
+                             connection=connection).send()
+            except Exception as e:
+                if connection is not None:
+                    # the connection might be broken
+                    self._pool.release(connection, discard=True)
+                    connection = None
+                with self._lock:
+                    self.failures.append((item, e))
+            else:
+                with self._lock:
+                    self.sent += 1
+        if connection is not None:
+            self._pool.release(connection)
+
+    def join(self):
+        """wait until all queued emails are processed and close connections
+
+        Returning ``(sent, failures)`` where ``failures`` is a list of
+        ``(datatuple_item, exception)``.
+        """
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._pool.close()
+        return self.sent, self.failures
+
+
+class BackgroundEmailDispatcher(object):
+    """Send emails queued in ``EmailOutbox`` on background threads
+
+    ``submit`` passes a list of ``EmailOutbox`` pks to one of
+    ``concurrency`` daemon threads which sends them with
+    ``EmailOutbox.objects.send``. The emails are claimed before being sent
+    and failed emails are kept in the outbox for retries thus emails which
+    could not be sent here (e.g. the process has exited or the transaction
+    which wrote them has not been committed yet) are sent by
+    ``registration_send_outbox`` command later.
+    """
+    def __init__(self, concurrency=None):
+        from django.conf import settings
+        if concurrency is None:
+            concurrency = settings.REGISTRATION_EMAIL_CONCURRENCY
+        self.concurrency = max(1, concurrency)
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, pks):
+        """queue ``EmailOutbox`` pks to be sent in background"""
+        with self._lock:
+            if len(self._threads) < self.concurrency:
+                # start workers lazily
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        self._queue.put(pks)
+
+    def _work(self):
+        from django.db import connection
+        from registration.models import EmailOutbox
+        while True:
+            pks = self._queue.get()
+            if pks is None:
+                break
+            try:
+                EmailOutbox.objects.send(pks)
+            except Exception:
+                logger.exception('Failed to send outbox emails %s in '
+                                 'background', pks)
+            finally:
+                # this thread is not managed by request signals
+                connection.close()
+
+    def join(self):
+        """wait until all queued emails are processed and stop threads"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+
+_background_email_dispatcher = None
+_background_email_dispatcher_lock = threading.Lock()
+
+
+def get_background_email_dispatcher():
+    """get the process-wide ``BackgroundEmailDispatcher``"""
+    global _background_email_dispatcher
+    if _background_email_dispatcher is None:
+        with _background_email_dispatcher_lock:
+            if _background_email_dispatcher is None:
+                _background_email_dispatcher = BackgroundEmailDispatcher()
+    return _background_email_dispatcher
+
+
+_background_email = threading.local()
+
+
+@contextmanager
+def background_email_dispatch():
+    """make ``send_mail`` and ``send_mass_mail`` return without waiting SMTP
+
+    ``send_mail`` and ``send_mass_mail`` called in ``with`` block in the
+    current thread write emails to ``EmailOutbox`` in the current
+    transaction instead of sending them. When the block exits without an
+    exception, the emails are passed to the process-wide
+    ``BackgroundEmailDispatcher``. Emails of a rolled back transaction are
+    never sent and emails which the dispatcher could not send are sent by
+    ``registration_send_outbox`` command. When the block is nested, the
+    emails are passed at the end of the outermost block.
+    """
+    dispatcher = get_background_email_dispatcher()
+    if getattr(_background_email, 'pks', None) is not None:
+        yield dispatcher
+        return
+    _background_email.pks = pks = []
+    try:
+        yield dispatcher
+    finally:
+        _background_email.pks = None
+    if pks:
+        dispatcher.submit(pks)
+
+
+def _enqueue_background_emails(datatuple):
+    """write emails to ``EmailOutbox`` in ``background_email_dispatch``
+    block and return the number of them or ``None`` outside of the block"""
+    pks = getattr(_background_email, 'pks', None)
+    if pks is None:
+        return None
+    from registration.models import EmailOutbox
+    emails = EmailOutbox.objects.enqueue(datatuple, bulk=False)
+    pks.extend(email.pk for email in emails)
+    return len(emails)
+
+
+def dispatch_mass_mail(datatuple, **kwargs):
+    """send emails in ``datatuple`` with ``EmailDispatcher``
+
+    Returning the number of sent emails. ``EmailDispatchError`` is raised
+    after all emails have been tried when some of them failed.
+    """
+    dispatcher = EmailDispatcher(**kwargs)
+    try:
+        for item in datatuple:
+            dispatcher.submit(*item)
+    finally:
+        sent, failures = dispatcher.join()
+    if failures:
+        raise EmailDispatchError(failures)
+    return sent
+
+
+def _send_with_pool(fn, *args):
+    pool = getattr(_email_connection_pool, 'pool', None)
+    if pool is None:
+        return fn(*args)
+    with pool.connection() as connection:
+        return fn(*args, connection=connection)
+
+
+def send_mail(subject, message, from_email, recipients, connection=None):
     """send mail to recipients
     
     this method use django-mailer_ ``send_mail`` method when
     the app is in ``INSTALLED_APPS``
 
+    The email is sent over ``connection`` if it is specified, written to
+    ``EmailOutbox`` in ``background_email_dispatch`` block, sent over a
+    pooled connection in ``email_connection_pool`` block, otherwise over a
+    new connection.
+
     .. Note::
         django-mailer_ ``send_mail`` is not used duaring unittest
         because it is a little bit difficult to check the number of
@@ -70,4 +799,41 @@ def send_mail(subject, message, from_email, recipients):
             return send_mail(subject, message, from_email, recipients, html_message=message)
         except ImportError:
             pass
-    return django_send_mail(subject, message, from_email, recipients)
+    if connection is not None:
+        return django_send_mail(subject, message, from_email, recipients,
+                                connection=connection)
+    queued = _enqueue_background_emails(
+        [(subject, message, from_email, recipients)])
+    if queued is not None:
+        return queued
+    return _send_with_pool(django_send_mail,
+                           subject, message, from_email, recipients)
+
+
+def send_mass_mail(datatuple, connection=None):
+    """send multiple mails over a single connection
+
+    each item of ``datatuple`` is ``(subject, message, from_email,
+    recipients)``. Like ``send_mail``, this method use django-mailer_
+    ``send_mass_mail`` method when the app is in ``INSTALLED_APPS`` and
+    ``connection`` or a pooled connection is used as ``send_mail``.
+
+    .. _django-mailer: http://code.google.com/p/django-mailer/
+    """
+    from django.conf import settings
+    from django.core.mail import send_mass_mail as django_send_mass_mail
+    import sys
+    if 'test' not in sys.argv and 'mailer' in settings.INSTALLED_APPS:
+        try:
+            from mailer import send_mass_mail
+            return send_mass_mail(datatuple)
+        except ImportError:
+            pass
+    if connection is not None:
+        return django_send_mass_mail(datatuple, connection=connection)
+    queued = _enqueue_background_emails(datatuple)
+    if queued is not None:
+        return queued
+    if settings.REGISTRATION_EMAIL_CONCURRENCY > 1:
+        return dispatch_mass_mail(datatuple)
+    return _send_with_pool(django_send_mass_mail, datatuple)
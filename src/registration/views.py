@@ -3,18 +3,36 @@
 Class based views for django-inspectional-registration
 """
 __author__ = 'Alisue <lambdalisue@hashnote.net>'
+import json
+import math
 from django.http import Http404
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.views.generic import TemplateView
 from django.views.generic.edit import ProcessFormView
 from django.views.generic.edit import FormMixin
+from django.views.generic.base import View
 from django.views.generic.base import TemplateResponseMixin
 from django.views.generic.detail import SingleObjectMixin
 from django.utils.text import ugettext_lazy as _
+from django.utils.http import urlencode
 
+from registration.conf import settings
+from registration.compat import force_unicode
 from registration.backends import get_backend
 from registration.models import RegistrationProfile
 from registration.forms import RegistrationForm
+from registration.forms import RegistrationFormUniqueEmail
+from registration.utils import validate_activation_key
+from registration.utils import remember_invalid_activation_key
+from registration.utils import is_invalid_activation_key_cached
+from registration.utils import generate_registration_token
+from registration.utils import load_registration_token
+from registration.utils import get_cached_availability
+from registration.utils import cache_availability
+from registration.utils import forget_availability
+from registration.utils import background_email_dispatch
+from registration.utils import throttle
 
 class RegistrationCompleteView(TemplateView):
     """A simple template view for registration complete"""
@@ -23,8 +41,11 @@ class RegistrationCompleteView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super(RegistrationCompleteView,
                         self).get_context_data(**kwargs)
+        if 'token' in self.request.GET:
+            # get registration_profile from the signed token
+            profile = self.get_profile_from_token(self.request.GET['token'])
         # get registration_profile instance from the session
-        if 'registration_profile_pk' in self.request.session:
+        elif 'registration_profile_pk' in self.request.session:
             profile_pk = self.request.session.pop('registration_profile_pk')
             profile = RegistrationProfile.objects.get(pk=profile_pk)
         else:
@@ -32,6 +53,22 @@ class RegistrationCompleteView(TemplateView):
         context['registration_profile'] = profile
         return context
 
+    def get_profile_from_token(self, token):
+        """get ``RegistrationProfile`` instance of ``token``
+
+        The profile and its user are loaded with a single query
+        """
+        data = load_registration_token(
+            token, max_age=settings.REGISTRATION_COMPLETE_TOKEN_MAX_AGE)
+        if data is None:
+            return None
+        profile_pk, user_pk = data
+        try:
+            return RegistrationProfile.objects.select_related('user').get(
+                pk=profile_pk, user__pk=user_pk)
+        except RegistrationProfile.DoesNotExist:
+            return None
+
 
 class RegistrationClosedView(TemplateView):
     """A simple template view for registraion closed
@@ -47,7 +84,38 @@ class ActivationCompleteView(TemplateView):
     template_name = r'registration/activation_complete.html'
 
 
-class ActivationView(TemplateResponseMixin, FormMixin,
+class ThrottleMixin(object):
+    """A mixin to throttle requests with fixed window counters
+
+    Requests of ``throttle_methods`` are throttled with the per-IP and the
+    global counters of ``throttle_scope`` specified by
+    ``REGISTRATION_THROTTLES`` setting (see ``registration.utils.throttle``).
+    Throttled requests are answered with 429 before any form validation or
+    database access.
+    """
+    throttle_scope = None
+    throttle_methods = ('POST',)
+
+    def get_throttle_ident(self, request):
+        """get the IP address of the client
+
+        Override this method when the site is behind a reverse proxy
+        """
+        return request.META.get('REMOTE_ADDR', '')
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.throttle_scope and request.method in self.throttle_methods:
+            wait = throttle(self.throttle_scope,
+                            self.get_throttle_ident(request))
+            if wait:
+                response = HttpResponse(_('Too many requests'), status=429,
+                                        content_type='text/plain')
+                response['Retry-After'] = str(int(math.ceil(wait)))
+                return response
+        return super(ThrottleMixin, self).dispatch(request, *args, **kwargs)
+
+
+class ActivationView(ThrottleMixin, TemplateResponseMixin, FormMixin,
                      SingleObjectMixin, ProcessFormView):
     """A complex view for activation
 
@@ -61,26 +129,42 @@ class ActivationView(TemplateResponseMixin, FormMixin,
     """
     template_name = r'registration/activation_form.html'
     model = RegistrationProfile
+    throttle_scope = 'activate'
+    # activation keys can be guessed by GET as well
+    throttle_methods = ('GET', 'POST')
 
     def __init__(self, *args, **kwargs):
         self.backend = get_backend()
         super(ActivationView, self).__init__(*args, **kwargs)
 
     def get_queryset(self):
-        """get ``RegistrationProfile`` queryset which status is 'accepted'"""
-        return self.model.objects.filter(_status='accepted')
+        """get ``RegistrationProfile`` queryset which status is 'accepted'
+
+        The ``user`` is selected together because it is required on
+        activation
+        """
+        return self.model.objects.filter(
+            _status='accepted').select_related('user')
 
     def get_object(self, queryset=None):
         """get ``RegistrationProfile`` instance by ``activation_key``
 
         ``activation_key`` should be passed by URL
         """
+        activation_key = self.kwargs['activation_key']
+        if (not validate_activation_key(activation_key) or
+                is_invalid_activation_key_cached(activation_key)):
+            # reject malformed, tampered, expired or recently failed key
+            # without database
+            raise Http404(_('An invalid activation key has passed'))
         queryset = queryset or self.get_queryset()
         try:
-            obj = queryset.get(activation_key=self.kwargs['activation_key'])
+            obj = queryset.get(activation_key=activation_key)
             if obj.activation_key_expired():
+                remember_invalid_activation_key(activation_key)
                 raise Http404(_('Activation key has expired'))
         except self.model.DoesNotExist:
+            remember_invalid_activation_key(activation_key)
             raise Http404(_('An invalid activation key has passed'))
         return obj
 
@@ -97,10 +181,12 @@ class ActivationView(TemplateResponseMixin, FormMixin,
 
         this method is called when form validation has successed.
         """
-        profile = self.get_object()
+        # the profile has been loaded in ``post``
+        profile = self.object
         password = form.cleaned_data['password1']
         self.activated_user = self.backend.activate(
-            profile.activation_key, self.request, password=password)
+            profile.activation_key, self.request, password=password,
+            profile=profile)
         return super(ActivationView, self).form_valid(form)
 
     def get(self, request, *args, **kwargs):
@@ -114,7 +200,8 @@ class ActivationView(TemplateResponseMixin, FormMixin,
         return super(ActivationView, self).post(request, *args, **kwargs)
 
 
-class RegistrationView(FormMixin, TemplateResponseMixin, ProcessFormView):
+class RegistrationView(ThrottleMixin, FormMixin, TemplateResponseMixin,
+                       ProcessFormView):
     """A complex view for registration
 
     GET:
@@ -129,13 +216,19 @@ class RegistrationView(FormMixin, TemplateResponseMixin, ProcessFormView):
     """
     template_name = r'registration/registration_form.html'
     custom_form_class = RegistrationForm
+    throttle_scope = 'register'
     def __init__(self, *args, **kwargs):
         self.backend = get_backend()
         super(RegistrationView, self).__init__(*args, **kwargs)
 
     def get_success_url(self):
         """get registration complete url via backend"""
-        return self.backend.get_registration_complete_url(self.new_user)
+        url = self.backend.get_registration_complete_url(self.new_user)
+        token = getattr(self, 'registration_token', None)
+        if token:
+            url = '%s%s%s' % (url, '&' if '?' in url else '?',
+                              urlencode({'token': token}))
+        return url
 
     def get_disallowed_url(self):
         """get registration closed url via backend"""
@@ -169,12 +262,21 @@ class RegistrationView(FormMixin, TemplateResponseMixin, ProcessFormView):
         self.new_user = self.backend.register(username, email,
                                               self.request,
                                               supplement=supplement)
+        # the cached availability is no longer correct
+        forget_availability([self.get_form_class(),
+                             self.backend.get_registration_form_class()],
+                            username=username, email1=email)
         profile = self.new_user.registration_profile
-        # save the profile on the session so that the RegistrationCompleteView
-        # can refer the profile instance.
-        # this instance is automatically removed when the user accessed
-        # RegistrationCompleteView
-        self.request.session['registration_profile_pk'] = profile.pk
+        if settings.REGISTRATION_COMPLETE_TOKEN:
+            # pass the profile to the RegistrationCompleteView with a signed
+            # token in the url to save the session write and the query
+            self.registration_token = generate_registration_token(profile)
+        else:
+            # save the profile on the session so that the
+            # RegistrationCompleteView can refer the profile instance.
+            # this instance is automatically removed when the user accessed
+            # RegistrationCompleteView
+            self.request.session['registration_profile_pk'] = profile.pk
         return super(RegistrationView, self).form_valid(form)
 
     def form_invalid(self, form, supplement_form=None):
@@ -209,3 +311,86 @@ class RegistrationView(FormMixin, TemplateResponseMixin, ProcessFormView):
             # registraion has closed
             return redirect(self.get_disallowed_url())
         return super(RegistrationView, self).dispatch(request, *args, **kwargs)
+
+
+class NonBlockingEmailMixin(object):
+    """A mixin to send the emails of the view in background
+
+    ``send_mail`` and ``send_mass_mail`` called while the request is
+    dispatched write the emails to ``EmailOutbox`` in the transaction and
+    the emails are passed to background threads after the view has returned
+    (see ``registration.utils.background_email_dispatch``) thus the request
+    thread does not wait for the SMTP server.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with background_email_dispatch():
+            return super(NonBlockingEmailMixin, self).dispatch(
+                request, *args, **kwargs)
+
+
+class NonBlockingRegistrationView(NonBlockingEmailMixin, RegistrationView):
+    """A ``RegistrationView`` which sends the emails in background"""
+
+
+class NonBlockingActivationView(NonBlockingEmailMixin, ActivationView):
+    """An ``ActivationView`` which sends the emails in background"""
+
+
+class AvailabilityView(ThrottleMixin, View):
+    """A lightweight JSON view to check the availability of username and email
+
+    GET:
+        Validate ``username`` and/or ``email`` in the query string with
+        ``form_class`` (the registration form of the backend by default; the
+        registration supplement form is not involved) and return a JSON
+        object like::
+
+            {"username": {"available": false,
+                          "errors": ["A user with that username already exists."]},
+             "email": {"available": true, "errors": []}}
+
+        An email address which is already in use is not available even if
+        the form accepts it. The answers are cached for
+        ``REGISTRATION_AVAILABILITY_CACHE_TIMEOUT`` seconds.
+    """
+    form_class = None
+    throttle_scope = 'availability'
+    throttle_methods = ('GET',)
+    # query parameter name: form field name
+    fields = (('username', 'username'), ('email', 'email1'))
+
+    def get_form_class(self):
+        """get registration form class via backend"""
+        return self.form_class or get_backend().get_registration_form_class()
+
+    def get_errors(self, form_class, field, value):
+        """get the errors of ``value`` of ``field`` of ``form_class``"""
+        data = {field: value}
+        if field == 'email1':
+            data['email2'] = value
+        form = form_class(data=data)
+        form.is_valid()
+        return [force_unicode(e) for e in form.errors.get(field, ())]
+
+    def get_availability(self, field, value):
+        """get the availability of ``value`` of registration form ``field``"""
+        form_class = self.get_form_class()
+        availability = get_cached_availability(form_class, field, value)
+        if availability is None:
+            errors = self.get_errors(form_class, field, value)
+            if not errors and field == 'email1' and \
+                    not issubclass(form_class, RegistrationFormUniqueEmail):
+                errors = self.get_errors(RegistrationFormUniqueEmail,
+                                         field, value)
+            availability = {'available': not errors, 'errors': errors}
+            cache_availability(form_class, field, value, availability)
+        return availability
+
+    def get(self, request, *args, **kwargs):
+        result = {}
+        for name, field in self.fields:
+            value = request.GET.get(name)
+            if value:
+                result[name] = self.get_availability(field, value)
+        return HttpResponse(json.dumps(result),
+                            content_type='application/json')
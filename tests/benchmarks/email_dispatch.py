@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Benchmark the concurrent email dispatcher
+
+A local fake SMTP server which sleeps ``--latency`` seconds before
+accepting each message is started, then ``--number`` emails are sent with
+``registration.utils.send_mass_mail`` with ``REGISTRATION_EMAIL_CONCURRENCY``
+of ``1`` (sequential) and of each ``--concurrency``.
+
+Usage::
+
+    python tests/benchmarks/email_dispatch.py [--number=100] [--latency=0.05]
+                                              [--concurrency=4,8,16]
+
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+import os
+import sys
+import time
+import threading
+import SocketServer
+
+
+class FakeSMTPHandler(SocketServer.StreamRequestHandler):
+    """A minimum SMTP conversation which accepts every message"""
+    latency = 0
+
+    def reply(self, line):
+        self.wfile.write(line + '\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        self.reply('220 localhost fake SMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in ('.\r\n', ''):
+                    pass
+                time.sleep(self.latency)
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSMTPServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def setup(port):
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    sys.path.insert(0, os.path.join(base_dir, 'src'))
+    sys.path.insert(0, os.path.join(base_dir, 'tests'))
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
+    from django.conf import settings
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST = 'localhost'
+    settings.EMAIL_PORT = port
+    import django
+    if django.VERSION >= (1, 7):
+        django.setup()
+
+
+def bench(concurrency, number):
+    from django.conf import settings
+    from registration.utils import send_mass_mail
+    settings.REGISTRATION_EMAIL_CONCURRENCY = concurrency
+    datatuple = [('subject', 'message', 'webmaster@localhost',
+                  ['user%d@example.com' % i]) for i in xrange(number)]
+    start = time.time()
+    send_mass_mail(datatuple)
+    elapsed = time.time() - start
+    print 'concurrency=%-4d %6d emails %8.3f sec %10.1f emails/sec' % (
+        concurrency, number, elapsed, number / elapsed)
+
+
+def main():
+    import optparse
+    parser = optparse.OptionParser()
+    parser.add_option('--number', type='int', default=100)
+    parser.add_option('--latency', type='float', default=0.05)
+    parser.add_option('--concurrency', default='4,8,16')
+    opts, args = parser.parse_args()
+
+    FakeSMTPHandler.latency = opts.latency
+    server = FakeSMTPServer(('localhost', 0), FakeSMTPHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    setup(server.server_address[1])
+
+    bench(1, opts.number)
+    for concurrency in opts.concurrency.split(','):
+        bench(int(concurrency), opts.number)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
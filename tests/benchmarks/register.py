@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Benchmark ``RegistrationManager.register``
+
+Compare the signups per second on a single core of the previous
+implementation (``create_user`` with a dummy password, then
+``set_unusable_password`` and a second ``save``) with the current single
+INSERT implementation. The default password hashers of Django are used.
+
+Usage::
+
+    python tests/benchmarks/register.py [--number=200]
+
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+import os
+import sys
+import time
+
+
+def setup():
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    sys.path.insert(0, os.path.join(base_dir, 'src'))
+    sys.path.insert(0, os.path.join(base_dir, 'tests'))
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    settings.DEBUG = False
+    import django
+    if django.VERSION >= (1, 7):
+        django.setup()
+    from django.core.management import call_command
+    call_command('syncdb', interactive=False, verbosity=0)
+
+
+def register_with_create_user(username, email, site):
+    """the previous implementation of ``register``"""
+    from registration.compat import get_user_model
+    from registration.models import RegistrationProfile
+    User = get_user_model()
+    new_user = User.objects.create_user(username, email, 'password')
+    new_user.set_unusable_password()
+    new_user.is_active = False
+    new_user.save()
+    RegistrationProfile.objects.create(user=new_user)
+    return new_user
+
+
+def register(username, email, site):
+    from registration.models import RegistrationProfile
+    return RegistrationProfile.objects.register(
+        username, email, site, send_email=False)
+
+
+def bench(name, fn, number):
+    from django.contrib.sites.models import Site
+    site = Site.objects.get_current()
+    start = time.time()
+    for i in xrange(number):
+        username = '%s%d' % (name, i)
+        fn(username, '%s@example.com' % username, site)
+    elapsed = time.time() - start
+    print '%-20s %8d signups %8.3f sec %10.1f signups/sec/core' % (
+        name, number, elapsed, number / elapsed)
+
+
+def main():
+    import optparse
+    parser = optparse.OptionParser()
+    parser.add_option('--number', type='int', default=200)
+    opts, args = parser.parse_args()
+    setup()
+    bench('create_user', register_with_create_user, opts.number)
+    bench('register', register, opts.number)
+
+
+if __name__ == '__main__':
+    main()
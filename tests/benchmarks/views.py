@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Load test ``RegistrationView`` and ``NonBlockingRegistrationView``
+
+A local fake SMTP server which sleeps ``--latency`` seconds before
+accepting each message is started, then ``--number`` registrations are
+POSTed to each view from ``--threads`` concurrent threads (like a threaded
+WSGI server) and the requests per second are compared. The registration
+email is sent in the request with ``RegistrationView``. With
+``NonBlockingRegistrationView`` it is written to the outbox and sent on
+background threads after the response; the time until the background emails
+have been sent and the number of emails left in the outbox are shown as
+well.
+
+Usage::
+
+    python tests/benchmarks/views.py [--number=200] [--threads=8]
+                                     [--latency=0.05]
+
+"""
+__author__ = 'Alisue <lambdalisue@hashnote.net>'
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from email_dispatch import FakeSMTPHandler
+from email_dispatch import FakeSMTPServer
+
+
+def setup(port, database):
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    sys.path.insert(0, os.path.join(base_dir, 'src'))
+    sys.path.insert(0, os.path.join(base_dir, 'tests'))
+    # ``ROOT_URLCONF`` is ``tests.urls``
+    sys.path.insert(0, base_dir)
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
+    from django.conf import settings
+    # the database is shared among threads thus ':memory:' cannot be used
+    settings.DATABASES['default']['NAME'] = database
+    # the registration email is sent in the transaction of ``register`` thus
+    # the write lock of sqlite is held while the SMTP server responds
+    settings.DATABASES['default']['OPTIONS'] = {'timeout': 600}
+    settings.DEBUG = False
+    settings.REGISTRATION_SUPPLEMENT_CLASS = None
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST = 'localhost'
+    settings.EMAIL_PORT = port
+    import django
+    if django.VERSION >= (1, 7):
+        django.setup()
+    from django.core.management import call_command
+    call_command('syncdb', interactive=False, verbosity=0)
+
+
+def make_request(username):
+    from django.test.client import RequestFactory
+    from django.contrib.sessions.middleware import SessionMiddleware
+    request = RequestFactory().post('/register/', {
+        'username': username,
+        'email1': '%s@example.com' % username,
+        'email2': '%s@example.com' % username,
+    })
+    SessionMiddleware().process_request(request)
+    return request
+
+
+def bench(name, view_class, number, threads):
+    from django.db import connection
+    from registration.models import EmailOutbox
+    from registration.utils import get_background_email_dispatcher
+    view = view_class.as_view()
+    requests = [make_request('%s%d' % (name, i)) for i in xrange(number)]
+    lock = threading.Lock()
+    errors = []
+
+    def work():
+        try:
+            while True:
+                with lock:
+                    if not requests:
+                        return
+                    request = requests.pop()
+                try:
+                    response = view(request)
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if response.status_code != 302:
+                    errors.append(response.status_code)
+        finally:
+            connection.close()
+
+    start = time.time()
+    workers = [threading.Thread(target=work) for i in xrange(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    get_background_email_dispatcher().join()
+    drained = time.time() - start
+    print '%-28s %6d requests %8.3f sec %8.1f requests/sec ' \
+          '(emails sent in %.3f sec, %d left in outbox, %d errors)' % (
+              name, number, elapsed, number / elapsed, drained,
+              EmailOutbox.objects.count(), len(errors))
+
+
+def main():
+    import optparse
+    parser = optparse.OptionParser()
+    parser.add_option('--number', type='int', default=200)
+    parser.add_option('--threads', type='int', default=8)
+    parser.add_option('--latency', type='float', default=0.05)
+    opts, args = parser.parse_args()
+
+    FakeSMTPHandler.latency = opts.latency
+    server = FakeSMTPServer(('localhost', 0), FakeSMTPHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    fd, database = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        setup(server.server_address[1], database)
+        from django.conf import settings
+        from registration.views import RegistrationView
+        from registration.views import NonBlockingRegistrationView
+        settings.REGISTRATION_EMAIL_CONCURRENCY = opts.threads
+        bench('RegistrationView', RegistrationView,
+              opts.number, opts.threads)
+        bench('NonBlockingRegistrationView', NonBlockingRegistrationView,
+              opts.number, opts.threads)
+    finally:
+        server.shutdown()
+        os.remove(database)
+
+
+if __name__ == '__main__':
+    main()